@@ -1,19 +1,40 @@
 import os
+import re
 import io
+import sys
 import glob
+import time
+import threading
+import subprocess
 import yaml
 from urllib.parse import quote
 import json
 import datetime
+import email.utils
 from datetime import date, timedelta
 import importlib
-from jinja2 import Template
-from urllib.parse import urljoin
-from PIL import Image
+import copy
+import hashlib
+import functools
+import itertools
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from jinja2 import Environment, DictLoader, FileSystemBytecodeCache
+from urllib.parse import urljoin, urlparse
 
+from .state import EpisodeIndex, DirSnapshot, MetadataCache, NegativeCache, FailureQueue, ObjectStore, sub_state_path, find_media, load_state, save_state
+from .filters import compile_filters, apply_filters
+from .media import derive_media, link_or_copy
+from .compress import compress_formats, write_compressed, remove_compressed
+from .retention import episode_groups, plan_retention, plan_eviction, is_protected
+from .thumbnails import write_thumbnails, sized_name
+from .output import ThreadOutput, inherit_output
 from .templates.episode_nfo import EPISODE_NFO_TMPL
 from .templates.show_nfo import SHOW_NFO_TMPL
 from .templates.feed import FEED_TMPL
+from .templates.index import INDEX_HTML_TMPL
+from .templates.style import FEED_STYLE_TMPL
 
 sub_defaults = {
     "retention_days": None,
@@ -26,6 +47,131 @@ sub_defaults = {
     "filename_template": "%(title)s [%(id)s][%(upload_date)s].%(ext)s",
 }
 
+# Seconds during which an entry without metadata is not extracted again, per reason
+negative_cache_ttl_defaults = {
+    "out of daterange": 30 * 86400,
+    "filtered": 30 * 86400,
+    "members-only": 7 * 86400,
+    "unavailable": 7 * 86400,
+    "failed": 3600,
+}
+
+# Fields of the info dict used by metadata_parse, kept in the .feed.json sidecar
+feed_sidecar_fields = [
+    "_type",
+    "id",
+    "title",
+    "upload_date",
+    "ext",
+    "description",
+    "thumbnail",
+    "duration",
+    "format",
+    "acodec",
+    "audio_ext",
+]
+
+inherited_config_keys = [
+    "output_dir",
+    "url_root",
+    "best",
+    "format",
+    "filename_template",
+    "new_feed_url_root",
+    "state_dir",
+    "slim_sidecar",
+    "poll_interval",
+    "poll_jitter",
+    "poll_backoff",
+    "poll_max_interval",
+    "poll_adaptive",
+    "poll_min_interval",
+    "poll_adaptive_window",
+    "poll_per_upload",
+    "shared_store",
+    "template_cache_dir",
+    "precompress",
+    "thumbnail_sizes",
+    "thumbnail_quality",
+    "thumbnail_workers",
+]
+
+templates = {
+    "feed.xml": FEED_TMPL,
+    "index.html": INDEX_HTML_TMPL,
+    "tvshow.nfo": SHOW_NFO_TMPL,
+    "episode.nfo": EPISODE_NFO_TMPL,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def template_environment(cache_dir=None):
+    """Jinja environment holding the compiled templates, shared by every
+    render of a run, and across runs through the bytecode cache in cache_dir."""
+    bytecode_cache = None
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    return Environment(loader=DictLoader(templates), bytecode_cache=bytecode_cache)
+
+
+def get_template(name, settings=None):
+    return template_environment((settings or {}).get("template_cache_dir")).get_template(name)
+
+
+def render_to_file(template, path, context, mode="w"):
+    """Render template into path chunk by chunk, without building the whole
+    output in memory."""
+    with open(path, mode) as fout:
+        for chunk in template.generate(context):
+            fout.write(chunk)
+
+
+def render_if_changed(template, path, context, volatile=("last_update",), compress=()):
+    """Render template into path only when its context changed since the last
+    render, ignoring the volatile keys.
+
+    The file is replaced atomically, and a <path>.headers.json sidecar keeps
+    the content hash along with the ETag and Last-Modified values to serve it
+    with. Its precompressed siblings in the compress formats follow the file.
+    Returns whether the file was written.
+    """
+    content = {k: v for k, v in context.items() if k not in volatile}
+    digest = hashlib.sha256(
+        json.dumps([templates.get(template.name), content], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    sidecar = "%s.headers.json" % path
+    if os.path.isfile(path) and load_state(sidecar, {}).get("hash") == digest:
+        write_compressed(path, compress, changed=False)
+        return False
+    tmp_path = "%s.tmp" % path
+    render_to_file(template, tmp_path, context)
+    os.replace(tmp_path, path)
+    write_compressed(path, compress)
+    save_state(sidecar, {
+        "hash": digest,
+        "etag": '"%s"' % digest[:32],
+        "last_modified": email.utils.formatdate(os.stat(path).st_mtime, usegmt=True),
+    })
+    return True
+
+
+def write_if_changed(path, text, compress=()):
+    """Atomically write text into path unless it already holds it, keeping its
+    precompressed siblings in the compress formats up to date."""
+    try:
+        with open(path) as f:
+            changed = f.read() != text
+    except OSError:
+        changed = True
+    if changed:
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    write_compressed(path, compress, changed)
+    return changed
+
 
 def load_config(config_path):
     config = {}
@@ -41,6 +187,48 @@ def sub_dir(sub, *parts):
     return os.path.join(sub["output_dir"], sub["name"], *parts)
 
 
+def episode_index(sub):
+    return EpisodeIndex(sub_state_path(sub, "episodes.jsonl"), sub_dir(sub))
+
+
+def negative_cache(sub):
+    fingerprint = json.dumps([sub.get("retention_days"), sub.get("matchtitle")])
+    return NegativeCache(sub_state_path(sub, "negative.json"), fingerprint)
+
+
+def failure_queue(sub):
+    return FailureQueue(sub_state_path(sub, "failures.json"))
+
+
+def object_store(sub):
+    """Store shared by the subscriptions of an output_dir, or None when the
+    subscription does not use it."""
+    if not sub.get("shared_store", False):
+        return None
+    return ObjectStore(os.path.join(sub["output_dir"], ".ydl-podcast", "store"))
+
+
+def negative_reason(detail):
+    """Classify why an entry yielded no metadata from the extractor's message."""
+    detail = (detail or "").lower()
+    if "not in range" in detail:
+        return "out of daterange"
+    if ("title" in detail and "match" in detail) or "does not pass filter" in detail:
+        return "filtered"
+    if "members" in detail:
+        return "members-only"
+    if any(s in detail for s in ["unavailable", "private video", "not available", "removed", "terminated"]):
+        return "unavailable"
+    return "failed"
+
+
+def negative_cache_ttl(sub, reason):
+    ttl = sub.get("negative_cache_ttl") or {}
+    if not isinstance(ttl, dict):
+        return ttl
+    return ttl.get(reason, negative_cache_ttl_defaults[reason])
+
+
 def sub_url(sub, filename):
     return "/".join([sub["url_root"], quote(sub["name"]), quote(filename)])
 
@@ -66,10 +254,96 @@ def silence_ydl(ydl, output=None, quiet=True):
             ydl._err_file = io.StringIO()
 
 
-def metadata_file_extension(metadata, data_path, basename):
+def _isfile(path, name, snapshot=None):
+    if snapshot is not None:
+        return snapshot.isfile(name)
+    return os.path.isfile(os.path.join(path, name))
+
+
+class YdlPool:
+    """Reusable YoutubeDL instances, so that extractors, the cookie jar and the
+    HTTP connections are initialized once per subscription instead of once per
+    call.
+
+    Instances are keyed by the options they were built with, except for the
+    runtime options below which are applied on each call. An instance is only
+    used by one caller at a time, so concurrent workers each get their own.
+    """
+
+    runtime_options = [
+        "quiet",
+        "simulate",
+        "ignoreerrors",
+        "extract_flat",
+        "skip_download",
+        "forcejson",
+        "dump_single_json",
+    ]
+
+    def __init__(self, ydl_mod):
+        self.ydl_mod = ydl_mod
+        self.created = 0
+        self.reused = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _key(self, options):
+        return repr(sorted(
+            (k, repr(v)) for k, v in options.items() if k not in self.runtime_options
+        ))
+
+    @contextmanager
+    def session(self, options, quiet=True):
+        key = (self._key(options), quiet)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            ydl = idle.pop() if idle else None
+            if ydl is None:
+                self.created += 1
+            else:
+                self.reused += 1
+        if ydl is None:
+            ydl = self.ydl_mod.YoutubeDL(options).__enter__()
+            silence_ydl(ydl, quiet=quiet)
+        saved = {k: ydl.params[k] for k in self.runtime_options if k in ydl.params}
+        for k in self.runtime_options:
+            ydl.params.pop(k, None)
+            if k in options:
+                ydl.params[k] = options[k]
+        if hasattr(ydl, "_num_downloads"):
+            ydl._num_downloads = 0
+        try:
+            yield ydl
+        finally:
+            for k in self.runtime_options:
+                ydl.params.pop(k, None)
+            ydl.params.update(saved)
+            with self._lock:
+                self._idle[key].append(ydl)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for instances in idle.values():
+            for ydl in instances:
+                ydl.__exit__(None, None, None)
+
+
+@contextmanager
+def ydl_session(ydl_mod, options, quiet=True, pool=None):
+    if pool is not None:
+        with pool.session(options, quiet=quiet) as ydl:
+            yield ydl
+        return
+    with ydl_mod.YoutubeDL(options) as ydl:
+        silence_ydl(ydl, quiet=quiet)
+        yield ydl
+
+
+def metadata_file_extension(metadata, data_path, basename, snapshot=None):
     ext = None
-    if "audio only" in metadata["format"] and os.path.isfile(
-        os.path.join(data_path, "%s.%s" % (basename, metadata.get("acodec", metadata.get("audio_ext"))))
+    if "audio only" in metadata["format"] and _isfile(
+        data_path, "%s.%s" % (basename, metadata.get("acodec", metadata.get("audio_ext"))), snapshot
     ):
         ext = metadata.get("acodec", metadata.get("audio_ext"))
     if ext is not None:
@@ -79,34 +353,43 @@ def metadata_file_extension(metadata, data_path, basename):
         raise Exception("No extension found")
     return ext
 
-def get_real_thumbnail_ext(metadata_path, default_ext):
+def get_real_thumbnail_ext(metadata_path, default_ext, snapshot=None):
     path = os.path.dirname(metadata_path)
     basename = strip_info_json_ext(metadata_path)
     extensions = ["jpg", "jpeg", default_ext, "png", "webp"]
     for ext in extensions:
-        if os.path.isfile(os.path.join(path, "%s.%s" % (basename, ext))):
+        if _isfile(path, "%s.%s" % (basename, ext), snapshot):
             return ext
     return default_ext
 
 
-def convert_thumbnail_to_jpg(path, thumbnail_filename):
-    ext = thumbnail_filename.split(".")[-1]
-    if ext == "jpg" or ext == "jpeg":
-        return thumbnail_filename
-    new_thumbnail_filename = thumbnail_filename.replace("." + ext, ".jpg")
-    if os.path.isfile(os.path.join(path, new_thumbnail_filename)):
-        return new_thumbnail_filename
-    try:
-        print("Converting thumbnail to jpg", thumbnail_filename)
-        with Image.open(os.path.join(path, thumbnail_filename)) as im:
-            rgb_im = im.convert("RGB")
-            rgb_im.save(os.path.join(path, new_thumbnail_filename))
-            return new_thumbnail_filename
-    except Exception as e:
-        print("Error converting thumbnail to jpg: %s" % e)
-        return thumbnail_filename
+def write_feed_sidecar(basename_path, metadata):
+    """Write the compact .feed.json sidecar of an episode from its info dict."""
+    sidecar = {key: metadata.get(key) for key in feed_sidecar_fields}
+    if sidecar["format"] is None:
+        sidecar["format"] = ""
+    path = "%s.feed.json" % basename_path
+    with open(path, "w") as f:
+        json.dump(sidecar, f)
+    return path
+
+
+def write_sub_sidecars(sub, snapshot=None):
+    """Backfill the .feed.json sidecars of the episodes of a subscription."""
+    if snapshot is None:
+        snapshot = sub_snapshot(sub)
+    written = []
+    for name in snapshot.endswith(".info.json"):
+        basename = name[: -len(".info.json")]
+        if snapshot.isfile("%s.feed.json" % basename):
+            continue
+        with open(snapshot.path(name)) as f:
+            metadata = json.load(f)
+        written.append(write_feed_sidecar(snapshot.path(basename), metadata))
+    return written
+
 
-def metadata_parse(metadata_path):
+def metadata_parse(metadata_path, snapshot=None):
     with open(metadata_path) as metadata:
         mdjs = json.load(metadata)
         if mdjs.get("_type") == "playlist":
@@ -117,20 +400,25 @@ def metadata_parse(metadata_path):
         path = os.path.dirname(metadata_path)
         thumbnail_file = None
         if mdjs.get("thumbnail") is not None:
-            thumb_ext = get_real_thumbnail_ext(metadata_path, mdjs["thumbnail"].split(".")[-1])
-            thumbnail_file = convert_thumbnail_to_jpg(path, "%s.%s" % (basename, thumb_ext))
-        extension = metadata_file_extension(mdjs, path, basename)
-        if not os.path.isfile(os.path.join(path, "%s.%s" % (basename, extension))):
-            with os.scandir(path) as directory:
-                for f in directory:
-                    ext = f.name.split(".")[-1]
-                    if (
-                        f.name.startswith(basename)
-                        and ext not in ["json", "jpg", "webp", "meta"]
-                        and (mdjs.get("thumbnail") is None or ext != thumb_ext)
-                    ):
-                        extension = ext
-                        break
+            thumb_ext = get_real_thumbnail_ext(metadata_path, mdjs["thumbnail"].split(".")[-1], snapshot)
+            # The jpg once write_sub_thumbnails converted it, in its pool
+            thumbnail_file = "%s.%s" % (basename, thumb_ext)
+        extension = metadata_file_extension(mdjs, path, basename, snapshot)
+        if not _isfile(path, "%s.%s" % (basename, extension), snapshot):
+            if snapshot is None:
+                with os.scandir(path) as directory:
+                    names = [f.name for f in directory]
+            else:
+                names = snapshot.names()
+            for name in names:
+                ext = name.split(".")[-1]
+                if (
+                    name.startswith(basename)
+                    and ext not in ["json", "jpg", "webp", "meta"]
+                    and (mdjs.get("thumbnail") is None or ext != thumb_ext)
+                ):
+                    extension = ext
+                    break
         upload_dt = datetime.datetime.strptime(mdjs["upload_date"], "%Y%m%d")
         return {
             "title": mdjs["title"],
@@ -147,33 +435,311 @@ def metadata_parse(metadata_path):
         }
 
 
-def get_metadata(ydl_mod, url, options, quiet=True, single_json=True):
+def _probe_options(options, quiet):
     my_options = options.copy()
-    extra = {"dump_single_json": True} if single_json else {"forcejson": True}
     my_options.update(
         {
             "quiet": quiet,
             "simulate": True,
             "ignoreerrors": True,
             "extract_flat": "in_playlist",
-            **extra,
         }
     )
-    output = io.StringIO()
-    with ydl_mod.YoutubeDL(my_options) as ydl:
+    return my_options
+
+
+def _sanitize_info(ydl, info):
+    # youtube_dl has no sanitize_info, its info dicts are already serializable
+    if hasattr(ydl, "sanitize_info"):
+        return ydl.sanitize_info(info)
+    return info
+
+
+def _iter_entries(entries, page_size=50):
+    """Iterator over the entries of a playlist as returned by the extractor: a
+    list, a generator, or a PagedList. youtube_dl's PagedList is neither
+    iterable nor indexable, it is paged through lazily with getslice."""
+    if entries is None:
+        return iter(())
+    if not hasattr(entries, "getslice"):
+        return iter(entries)
+    # Slices aligned on the extractor pages fetch each page once
+    return _iter_pages(entries, getattr(entries, "_pagesize", None) or page_size)
+
+
+def _iter_pages(entries, page_size):
+    start = 0
+    while True:
+        page = entries.getslice(start, start + page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+class _SharedEntries:
+    """Playlist entries iterable several times, pulling from the extractor's
+    (possibly lazy) entries only as far as the furthest consumer went."""
+
+    def __init__(self, entries):
+        self._source = _iter_entries(entries)
+        self._items = []
+        self._done = False
+        self._lock = threading.Lock()
+
+    def _pull(self, i):
+        with self._lock:
+            while len(self._items) <= i and not self._done:
+                try:
+                    item = next(self._source)
+                except StopIteration:
+                    self._done = True
+                    break
+                except Exception:
+                    self._done = True
+                    raise
+                if item is not None and item.get("_type") == "playlist":
+                    item = {**item, "entries": _SharedEntries(item.get("entries"))}
+                self._items.append(item)
+            return i < len(self._items)
+
+    def __iter__(self):
+        i = 0
+        while self._pull(i):
+            yield self._items[i]
+            i += 1
+
+
+class ExtractionCache:
+    """In-run cache of the extractor results, shared by the subscriptions
+    pointing at the same playlists or videos.
+
+    Results are keyed by URL and the options which may change what the
+    extractor returns. Options only deciding what is done with the result
+    (format selection, output template, date and title matching, ...) are left
+    out of the key and applied by each subscription on its own copy.
+    """
+
+    selection_options = [
+        "outtmpl",
+        "format",
+        "postprocessors",
+        "writeinfojson",
+        "writethumbnail",
+        "max_downloads",
+        "playlistreverse",
+        "daterange",
+        "matchtitle",
+        "playliststart",
+        "playlistend",
+        "playlist_items",
+        "break_on_reject",
+    ] + YdlPool.runtime_options
+
+    def __init__(self, ydl_mod):
+        self.ydl_mod = ydl_mod
+        self.stats = {"playlist_hits": 0, "playlist_misses": 0, "entry_hits": 0, "entry_misses": 0}
+        self._results = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._ydls = []
+
+    def _key(self, kind, url, options):
+        return (kind, url, repr(sorted(
+            (k, repr(v)) for k, v in options.items() if k not in self.selection_options
+        )))
+
+    def _get(self, kind, url, options, extract):
+        key = self._key(kind, url, options)
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                if key in self._results:
+                    self.stats["%s_hits" % kind] += 1
+                    return self._results[key]
+                self.stats["%s_misses" % kind] += 1
+            try:
+                result = (extract(), None)
+            except self.ydl_mod.utils.YoutubeDLError as e:
+                result = (None, e)
+            with self._lock:
+                self._results[key] = result
+            return result
+
+    def playlist(self, url, options, quiet=True):
+        """Raw (unprocessed) playlist result of url, with shared entries."""
+
+        def _extract():
+            # Owned by the cache, as other subscriptions may keep pulling entries
+            ydl = self.ydl_mod.YoutubeDL(_probe_options(options, quiet)).__enter__()
+            silence_ydl(ydl, quiet=quiet)
+            with self._lock:
+                self._ydls.append(ydl)
+            result = _extract_playlist(ydl, url)
+            if result is not None:
+                result = {**result, "entries": _SharedEntries(result.get("entries"))}
+            return result
+
+        result, error = self._get("playlist", url, options, _extract)
+        if error is not None:
+            raise error
+        return result
+
+    def entry(self, ydl, url, options):
+        """Raw (unprocessed) info dict of the video at url."""
+        result, error = self._get("entry", url, options, lambda: ydl.extract_info(url, download=False, process=False))
+        if error is not None:
+            raise error
+        return copy.deepcopy(result)
+
+    def saved(self):
+        return self.stats["playlist_hits"] + self.stats["entry_hits"]
+
+    def close(self):
+        with self._lock:
+            ydls, self._ydls = self._ydls, []
+        for ydl in ydls:
+            ydl.__exit__(None, None, None)
+
+
+def extract_entry(ydl_mod, url, options, quiet=True, pool=None, cache=None):
+    """Extract the info dict of a single video in-process.
+
+    Returns the info dict (with its target _filename) and None, or None and the
+    reason why no metadata is available.
+    """
+    my_options = _probe_options(options, quiet)
+    # Let extraction errors raise, to report their reason
+    my_options["ignoreerrors"] = False
+    with ydl_session(ydl_mod, my_options, quiet, pool) as ydl:
         try:
-            silence_ydl(ydl, output=output, quiet=quiet)
-            ydl.download([url])
+            if cache is not None:
+                info = ydl.process_ie_result(cache.entry(ydl, url, my_options), download=False)
+            else:
+                info = ydl.extract_info(url, download=False)
+        except ydl_mod.utils.YoutubeDLError as e:
+            return None, str(e)
+        if info is None:
+            return None, "no metadata returned"
+        if "format" not in info and "ext" in info:
+            info["format"] = info["ext"]
+        reason = ydl._match_entry(info, incomplete=False)
+        if reason is not None:
+            return None, reason
+        info["_filename"] = ydl.prepare_filename(info)
+        return _sanitize_info(ydl, info), None
+
+
+_playlist_item_re = re.compile(r"^([+-]?\d+)?(?:[:-]([+-]?\d+)?)?$")
+
+
+def parse_playlist_items(spec):
+    """1-based inclusive (start, end) ranges of a playlist_items option such
+    as "1-3,7,10-" (end is None for open ranges, negative indices count from
+    the end of the playlist)."""
+    ranges = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        match = _playlist_item_re.match(part)
+        if not part or match is None:
+            continue
+        start = int(match.group(1)) if match.group(1) else 1
+        if len(part) == len(match.group(1) or ""):
+            end = start
+        else:
+            end = int(match.group(2)) if match.group(2) else None
+        ranges.append((start, end))
+    return ranges
+
+
+def _slice_entries(entries, params):
+    """Apply the playliststart, playlistend and playlist_items options, which
+    the extractor ignores when called with process=False. Iteration stops after
+    the last selected index, so that no further playlist page is fetched."""
+    if params.get("playlist_items"):
+        ranges = parse_playlist_items(params["playlist_items"])
+    else:
+        end = params.get("playlistend")
+        ranges = [(params.get("playliststart") or 1, end if end is None or end > 0 else None)]
+    if ranges == [(1, None)]:
+        yield from entries
+        return
+    if any(start < 0 or (end is not None and end < 0) for start, end in ranges):
+        entries = list(entries)
+        count = len(entries)
+        ranges = [
+            (start + count + 1 if start < 0 else start, end + count + 1 if end is not None and end < 0 else end)
+            for start, end in ranges
+        ]
+    last = None if any(end is None for _, end in ranges) else max(end for _, end in ranges)
+    for i, entry in enumerate(entries, 1):
+        if last is not None and i > last:
+            return
+        if any(start <= i and (end is None or i <= end) for start, end in ranges):
+            yield entry
+
+
+def _iter_flat_entries(ydl, result):
+    """Flat entries of a playlist and of its nested playlists, sliced and
+    matched against the options of ydl. Returns True when break_on_reject
+    stopped the iteration."""
+    for entry in _slice_entries(_iter_entries(result.get("entries")), ydl.params):
+        if entry is None:
+            continue
+        if entry.get("_type") == "playlist":
+            if (yield from _iter_flat_entries(ydl, entry)):
+                return True
+        elif ydl._match_entry(entry, incomplete=True) is None:
+            yield entry
+        elif ydl.params.get("break_on_reject"):
+            return True
+    return False
+
+
+def _extract_playlist(ydl, url):
+    result = ydl.extract_info(url, download=False, process=False)
+    # Follow redirections to the actual playlist (eg. channel -> videos tab)
+    for _ in range(5):
+        if result is None or result.get("_type") not in ("url", "url_transparent"):
+            break
+        result = ydl.extract_info(
+            result["url"], download=False, process=False, ie_key=result.get("ie_key")
+        )
+    return result
+
+
+def stream_metadata(ydl_mod, url, options, quiet=True, pool=None, cache=None):
+    """Generator over the flat playlist of url, extracted in-process.
+
+    The first item is the playlist info dict (without its entries), the
+    following items are the flat entries, yielded as the extractor produces
+    them, so that only the consumed playlist pages are fetched. The first item
+    is None when no metadata was found.
+    """
+    with ydl_session(ydl_mod, _probe_options(options, quiet), quiet, pool) as ydl:
+        try:
+            if cache is not None:
+                result = cache.playlist(url, options, quiet)
+            else:
+                result = _extract_playlist(ydl, url)
+        except ydl_mod.utils.YoutubeDLError as e:
+            if not quiet:
+                print(e)
+            result = None
+        if result is None:
+            yield None
+            return
+        yield _sanitize_info(ydl, {k: v for k, v in result.items() if k != "entries"})
+        entries = _iter_flat_entries(ydl, result)
+        if options.get("playlistreverse"):
+            entries = reversed(list(entries))
+        try:
+            for entry in entries:
+                yield _sanitize_info(ydl, entry)
         except ydl_mod.utils.YoutubeDLError as e:
             if not quiet:
                 print(e)
-
-    result = output.getvalue()
-    if not single_json:
-        result = result.split("\n")[0]
-        if len(result) == 0:
-            return None
-    return json.loads(result)
 
 
 def process_options(ydl_mod, sub):
@@ -215,7 +781,7 @@ def process_options(ydl_mod, sub):
 
     return options
 
-def get_podcast_icon(ydl_mod, sub, metadata):
+def get_podcast_icon(ydl_mod, sub, metadata, pool=None):
     icon_filepath = sub_dir(sub, "icon.jpg")
     if os.path.isfile(icon_filepath):
         return
@@ -233,129 +799,747 @@ def get_podcast_icon(ydl_mod, sub, metadata):
         "writeinfojson": False,
     }
 
-    with ydl_mod.YoutubeDL(options) as ydl:
+    with ydl_session(ydl_mod, options, True, pool) as ydl:
         try:
-            silence_ydl(ydl, quiet=True)
             ydl.download(['/'.join([channel_url, 'about'])])
         except ydl_mod.utils.YoutubeDLError:
             pass
 
-def flatten_entries(metadata, entries):
-    for entry in metadata.get("entries", []):
-        if entry.get("_type") == "playlist":
-            flatten_entries(entry, entries)
-        else:
-            entries.append(entry)
-
-
-def _download_with_ydl(ydl_mod, options, url, quiet):
-    with ydl_mod.YoutubeDL(options) as ydl:
-        if quiet:
-            silence_ydl(ydl, quiet=True)
+def _download_with_ydl(ydl_mod, options, url, quiet, pool=None, errors=None):
+    with ydl_session(ydl_mod, options, quiet, pool) as ydl:
         try:
             ydl.download([url])
         except ydl_mod.utils.YoutubeDLError as e:
             if not quiet:
                 print("Download failed for %s: %s" % (url, e))
+            if errors is not None:
+                errors.append(str(e))
             return False
     return True
 
 
-def download(ydl_mod, sub):
+def download(ydl_mod, sub, cache=None):
+    pool = YdlPool(ydl_mod)
+    try:
+        return _download(ydl_mod, sub, pool, cache)
+    finally:
+        pool.close()
+        print(
+            "YoutubeDL instances for %s: %d created, %d reused"
+            % (sub["name"], pool.created, pool.reused)
+        )
+
+
+def _download(ydl_mod, sub, pool, cache=None):
     downloaded = []
     options = process_options(ydl_mod, sub)
-    metadata = get_metadata(ydl_mod, sub["url"], options, sub["quiet"])
+    stream = stream_metadata(ydl_mod, sub["url"], options, sub["quiet"], pool, cache)
+    metadata = next(stream)
 
     if metadata is None:
         print("No metadata found for %s" % sub["name"])
         return
 
-    entries = []
-    flatten_entries(metadata, entries)
+    get_podcast_icon(ydl_mod, sub, metadata, pool)
 
-    get_podcast_icon(ydl_mod, sub, metadata)
+    if metadata.get("_type") == "playlist" and (metadata.get("extractor") == "generic" or sub.get("download_as_playlist", False)):
+        stream.close()
+        _download_with_ydl(ydl_mod, options, sub["url"], sub["quiet"], pool)
+        return {}
 
+    index = episode_index(sub)
+    negatives = negative_cache(sub) if sub.get("negative_cache", True) else None
+    failures = failure_queue(sub)
+    entries = stream
+    filters = compile_filters(sub.get("filters"))
+    dropped = {}
+    if filters:
+        entries = apply_filters(entries, filters, dropped)
     if sub["download_last"] is not None and not sub.get("initialize", False):
-        entries = entries[: sub["download_last"]]
+        # Stop pulling playlist pages once enough entries were seen
+        entries = itertools.islice(entries, sub["download_last"])
+    if sub.get("incremental_discovery") and not sub.get("initialize", False) and not _full_scan_due(sub):
+        entries = _stop_at_known(entries, index, int(sub["incremental_discovery"]))
+    concurrency = max(1, int(sub.get("episode_concurrency", 1) or 1))
+    postprocess = None
+    if sub.get("postprocess_workers"):
+        postprocess = _PostprocessQueue(sub["postprocess_workers"])
+    try:
+        if concurrency == 1:
+            for i, md in enumerate(entries):
+                entry, stop = _download_entry(
+                    ydl_mod, sub, options, index, i, md, pool, negatives, failures, cache, postprocess
+                )
+                if entry is not None:
+                    downloaded.append(entry)
+                if stop:
+                    break
+            return _postprocessed(downloaded, postprocess)
 
-    if metadata.get("_type") == "playlist" and (metadata.get("extractor") == "generic" or sub.get("download_as_playlist", False)):
-        _download_with_ydl(ydl_mod, options, sub["url"], sub["quiet"])
-        return {}
+        host_limits = _HostLimits(sub.get("host_concurrency", 2))
+        stop_event = threading.Event()
 
-    for i, md in enumerate(entries):
-        # .meta is written only after a successful download, so its presence means the
-        # video was fully downloaded. Still verify the media file exists alongside it —
-        # if it was deleted manually, fall through and re-download.
-        existing_meta = glob.glob(sub_dir(sub, "*[%s]*.meta" % md["id"]))
-        if existing_meta:
-            meta_basename = existing_meta[0][:-5]
-            has_media = any(
-                f.split(".")[-1] not in ["json", "jpg", "jpeg", "webp", "meta", "part", "ytdl", "nfo"]
-                for f in glob.glob(meta_basename + ".*")
-            )
-            if has_media:
-                if not sub["quiet"]:
-                    print("Skipping already retrieved {} - {}".format(md["id"], md.get("title")))
-                if sub["download_last"] is not None and i >= sub["download_last"]:
+        def _run(i, md):
+            if stop_event.is_set():
+                return None
+            with host_limits.slot(md):
+                if stop_event.is_set():
+                    return None
+                entry, stop = _download_entry(
+                    ydl_mod, sub, options, index, i, md, pool, negatives, failures, cache, postprocess
+                )
+            if stop:
+                stop_event.set()
+            return entry
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = []
+            run = inherit_output(_run)
+            for i, md in enumerate(entries):
+                if stop_event.is_set():
                     break
-                continue
-        entry = get_metadata(ydl_mod, md["url"], options, quiet=True, single_json=False)
-        if entry is None:
+                futures.append(executor.submit(run, i, md))
+            for future in futures:
+                entry = future.result()
+                if entry is not None:
+                    downloaded.append(entry)
+        return _postprocessed(downloaded, postprocess)
+    finally:
+        if postprocess is not None:
+            postprocess.close()
+        stream.close()
+        if negatives is not None:
+            negatives.save(time.time())
+        failures.save()
+        if dropped:
+            print(
+                "Filtered out of %s: %s"
+                % (sub["name"], ", ".join("%d by %s" % (count, name) for name, count in sorted(dropped.items())))
+            )
+
+
+def _postprocessed(downloaded, postprocess):
+    """Add the episodes whose post-processing completed to downloaded."""
+    if postprocess is not None:
+        downloaded += [entry for entry in postprocess.results() if entry is not None]
+    return downloaded
+
+
+def _full_scan_due(sub):
+    """Whether this run should enumerate the whole playlist, counting runs in
+    the subscription state to force one every full_scan_every runs."""
+    if sub.get("full_scan", False):
+        return True
+    every = sub.get("full_scan_every")
+    if not every:
+        return False
+    path = sub_state_path(sub, "discovery.json")
+    state = load_state(path, {})
+    runs = state.get("runs", 0) + 1
+    due = runs >= int(every)
+    save_state(path, {"runs": 0 if due else runs})
+    return due
+
+
+def _stop_at_known(entries, index, limit):
+    """Stop iterating entries after limit consecutive ids already in the index,
+    downloaded or deleted by retention."""
+    known = 0
+    for md in entries:
+        if md["id"] in index:
+            known += 1
+            if known >= limit:
+                return
+        else:
+            known = 0
+        yield md
+
+
+class _HostLimits:
+    """Per extractor/host semaphores capping concurrent requests to one site."""
+
+    def __init__(self, limit):
+        self._limit = max(1, int(limit or 1))
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(md):
+        return md.get("ie_key") or urlparse(md.get("url") or "").netloc
+
+    @contextmanager
+    def slot(self, md):
+        key = self.key(md)
+        with self._lock:
+            semaphore = self._semaphores.setdefault(key, threading.BoundedSemaphore(self._limit))
+        with semaphore:
+            yield
+
+
+def _download_entry(
+    ydl_mod, sub, options, index, i, md, pool=None, negatives=None, failures=None, cache=None, postprocess=None
+):
+    """Retrieve a single flat playlist entry.
+
+    Returns the downloaded entry (or None), and whether enumeration should stop.
+    """
+    # The index only records episodes whose .meta was written, i.e. which were fully
+    # downloaded. Still verify the media file exists — if it was deleted manually,
+    # fall through and re-download.
+    known = index.get(md["id"])
+    if known is not None and known.get("retired"):
+        if not sub["quiet"]:
+            print("Skipping deleted {} - {}".format(md["id"], md.get("title")))
+        return None, sub["download_last"] is not None and i >= sub["download_last"]
+    if known is not None and known["meta"] and known["media"] is not None:
+        if os.path.isfile(sub_dir(sub, known["media"])):
             if not sub["quiet"]:
-                print("No metadata found for %s, skipping (likely due to the video upload date being out of range)" % md["url"])
-            continue
-        mdfile_name = "%s.meta" % ".".join(entry["_filename"].split(".")[:-1])
-        if not os.path.isfile(mdfile_name) and not entry.get("is_live", False):
-            if not _download_with_ydl(ydl_mod, options, entry["webpage_url"], sub["quiet"]):
-                continue
-            with open(mdfile_name, "w+") as f:
-                entry.update(
-                    {
-                        "subscription_name": sub["name"],
-                        "formats": [
-                            fmt
-                            for fmt in entry.get("formats", [])
-                            if (
-                                options.get("format") is None
-                                or (fmt.get("format") == options.get("format"))
-                            )
-                        ],
-                    }
-                )
-                downloaded.append(entry)
-        elif entry.get("is_live", False) and not sub["quiet"]:
+                print("Skipping already retrieved {} - {}".format(md["id"], md.get("title")))
+            return None, sub["download_last"] is not None and i >= sub["download_last"]
+    if _failure_pending(sub, failures, md):
+        return None, False
+    if negatives is not None:
+        negative = negatives.get(md["id"], time.time())
+        if negative is not None:
+            if not sub["quiet"]:
+                print("Skipping {} - {}: {} (cached)".format(md["id"], md.get("title"), negative["reason"]))
+            return None, False
+    entry, detail = extract_entry(ydl_mod, md["url"], options, quiet=True, pool=pool, cache=cache)
+    if entry is None:
+        reason = negative_reason(detail)
+        if not sub["quiet"]:
+            print("No metadata found for %s, skipping (%s): %s" % (md["url"], reason, detail))
+        if negatives is not None:
+            negatives.add(md["id"], reason, detail, time.time() + negative_cache_ttl(sub, reason))
+        return None, False
+    mdfile_name = "%s.meta" % ".".join(entry["_filename"].split(".")[:-1])
+    store = object_store(sub)
+    object_dir = None
+    if store is not None:
+        object_dir = store.object_dir(
+            entry.get("extractor_key") or md.get("ie_key") or "generic", entry["id"], store.format_key(options)
+        )
+    if not os.path.isfile(mdfile_name) and not entry.get("is_live", False):
+        # Subscriptions sharing the object wait for the first one to check it in
+        with store.lock(object_dir) if object_dir is not None else nullcontext():
+            entry = _retrieve_entry(
+                ydl_mod, sub, options, index, entry, mdfile_name, store, object_dir, pool, failures, postprocess
+            )
+        return entry, False
+    elif entry.get("is_live", False) and not sub["quiet"]:
+        print(
+            "Skipping ongoing live {} - {}".format(
+                entry.get("id"), entry.get("title")
+            )
+        )
+    elif not sub["quiet"]:
+        print(
+            "Skipping already retrieved {} - {}".format(
+                entry.get("id"), entry.get("title")
+            )
+        )
+        if sub["download_last"] is not None and i > sub["download_last"]:
+            return None, True
+    return None, False
+
+
+def _retrieve_entry(ydl_mod, sub, options, index, entry, mdfile_name, store, object_dir, pool, failures, postprocess):
+    """Link an episode from the shared store, or download it. Returns the
+    entry once recorded, or None when it failed or is still post-processing."""
+    errors = []
+    if object_dir is not None and store.checkout(object_dir, mdfile_name[: -len(".meta")]):
+        if not sub["quiet"]:
+            print("Linked {} - {} from the shared store".format(entry["id"], entry.get("title")))
+        return _finish_entry(sub, options, index, entry, mdfile_name, object_dir, failures)
+    download_options, audio_pp = options, None
+    if postprocess is not None:
+        download_options, audio_pp = split_postprocessors(options)
+    if not _download_with_ydl(ydl_mod, download_options, entry["webpage_url"], sub["quiet"], pool, errors):
+        _record_failure(sub, failures, entry["id"], entry, errors[-1] if errors else None)
+        return None
+    if audio_pp is not None:
+        # Leave the network slot to the next download while ffmpeg runs
+        postprocess.submit(
+            _postprocess_entry, sub, options, index, entry, mdfile_name, object_dir, failures, audio_pp
+        )
+        return None
+    return _finish_entry(sub, options, index, entry, mdfile_name, object_dir, failures)
+
+
+def _record_failure(sub, failures, video_id, entry, error):
+    if failures is None:
+        return
+    extra = {"title": entry.get("title")}
+    if entry.get("webpage_url") is not None:
+        extra["url"] = entry["webpage_url"]
+    failures.record(
+        video_id,
+        error,
+        time.time(),
+        sub.get("retry_backoff", 3600),
+        sub.get("retry_max_attempts", 5),
+        **extra
+    )
+
+
+def _finish_entry(sub, options, index, entry, mdfile_name, object_dir, failures):
+    """Record a retrieved episode: shared store, .meta, sidecar and index."""
+    if object_dir is not None and not object_store(sub).checkin(object_dir, mdfile_name[: -len(".meta")]):
+        object_dir = None
+    if failures is not None:
+        failures.remove(entry["id"])
+    with open(mdfile_name, "w+") as f:
+        if object_dir is not None:
+            entry["_store"] = object_dir
+        entry.update(
+            {
+                "subscription_name": sub["name"],
+                "formats": [
+                    fmt
+                    for fmt in entry.get("formats", [])
+                    if (
+                        options.get("format") is None
+                        or (fmt.get("format") == options.get("format"))
+                    )
+                ],
+            }
+        )
+        json.dump(entry, f)
+    if sub.get("slim_sidecar", False):
+        write_feed_sidecar(mdfile_name[: -len(".meta")], entry)
+    _index_download(index, entry, mdfile_name, object_dir)
+    return entry
+
+
+def split_postprocessors(options):
+    """Options to download without the FFmpegExtractAudio postprocessor, and
+    that postprocessor (or None), to run it as a separate stage."""
+    postprocessors = options.get("postprocessors") or []
+    audio = [pp for pp in postprocessors if pp.get("key") == "FFmpegExtractAudio"]
+    if not audio:
+        return options, None
+    return {**options, "postprocessors": [pp for pp in postprocessors if pp is not audio[0]]}, audio[0]
+
+
+class _PostprocessQueue:
+    """Bounded pool of CPU workers running the ffmpeg stage of downloaded
+    episodes, separate from the network workers."""
+
+    def __init__(self, workers):
+        workers = max(1, int(workers))
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        # Block the downloads rather than piling up raw files waiting for ffmpeg
+        self._slots = threading.BoundedSemaphore(2 * workers)
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        self._slots.acquire()
+        future = self._executor.submit(inherit_output(fn), *args)
+        future.add_done_callback(lambda f: self._slots.release())
+        with self._lock:
+            self._futures.append(future)
+
+    def results(self):
+        self._executor.shutdown(wait=True)
+        return [future.result() for future in self._futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def _postprocess_entry(sub, options, index, entry, mdfile_name, object_dir, failures, audio_pp):
+    """Extract the audio of a downloaded episode, then record it."""
+    basename_path = mdfile_name[: -len(".meta")]
+    directory, basename = os.path.split(basename_path)
+    if entry.get("_filename") and os.path.isfile(entry["_filename"]):
+        media = os.path.basename(entry["_filename"])
+    else:
+        # Merged or remuxed formats end up with another extension
+        media = find_media(basename, _episode_files(basename_path))
+    if media is None:
+        _record_failure(sub, failures, entry["id"], entry, "Downloaded media not found")
+        return None
+    src = os.path.join(directory, media)
+    try:
+        dst = derive_media(
+            src,
+            basename_path,
+            True,
+            audio_pp.get("preferredcodec", "best"),
+            acodec=entry.get("acodec"),
+            vcodec=entry.get("vcodec"),
+            quality=audio_pp.get("preferredquality"),
+            ffmpeg=ffmpeg_path(sub),
+            nice=sub.get("postprocess_nice", 10),
+            ionice=sub.get("postprocess_ionice"),
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        print("Post-processing failed for %s: %s" % (entry["id"], e))
+        _record_failure(sub, failures, entry["id"], entry, str(e))
+        return None
+    if not os.path.samefile(dst, src) and not options.get("keepvideo", False):
+        os.remove(src)
+    entry["ext"] = dst.rsplit(".", 1)[-1]
+    return _finish_entry(sub, options, index, entry, mdfile_name, object_dir, failures)
+
+
+def _failure_pending(sub, failures, md):
+    """Whether md failed before and is not eligible for a new attempt yet."""
+    failure = failures.get(md["id"]) if failures is not None else None
+    if failure is not None and (failure["gave_up"] or failure["next_eligible"] > time.time()):
+        if not sub["quiet"]:
             print(
-                "Skipping ongoing live {} - {}".format(
-                    entry.get("id"), entry.get("title")
+                "Skipping {} - {}: {} failed attempt(s), {}".format(
+                    md["id"],
+                    md.get("title"),
+                    failure["attempts"],
+                    "gave up" if failure["gave_up"] else "retrying later",
                 )
             )
-        elif not sub["quiet"]:
-            print(
-                "Skipping already retrieved {} - {}".format(
-                    entry.get("id"), entry.get("title")
+        return True
+    return False
+
+
+def _episode_files(basename_path):
+    """Names of the files of an episode, globbed from its escaped basename
+    rather than listing the whole directory."""
+    return [os.path.basename(f) for f in glob.glob(glob.escape(basename_path) + ".*")]
+
+
+def _index_download(index, entry, mdfile_name, store=None):
+    basename = os.path.basename(mdfile_name)[: -len(".meta")]
+    media = find_media(basename, _episode_files(mdfile_name[: -len(".meta")]))
+    size = os.path.getsize(os.path.join(os.path.dirname(mdfile_name), media)) if media else None
+    return index.record(
+        entry["id"], basename, media, meta=True, size=size, store=store, upload_date=entry.get("upload_date")
+    )
+
+
+def source_sub(config, sub):
+    """Prepared source subscription of a derived subscription, or None."""
+    for source in config.get("subscriptions") or []:
+        if source.get("name") == sub.get("derive_from") and source.get("name") != sub["name"]:
+            return prepare_sub(config, source)
+    return None
+
+
+def _episode_metadata(snapshot, basename):
+    for suffix in [".info.json", ".feed.json"]:
+        if snapshot.isfile(basename + suffix):
+            md = load_state(snapshot.path(basename + suffix))
+            if isinstance(md, dict) and md.get("id") is not None:
+                return suffix, md
+    return None, None
+
+
+def _derived(sub, index, video_id):
+    """Whether an episode of a derived subscription needs no derivation."""
+    known = index.get(video_id)
+    if known is None:
+        return False
+    if known.get("retired"):
+        return True
+    return known["meta"] and known["media"] is not None and os.path.isfile(sub_dir(sub, known["media"]))
+
+
+def derive(sub, source):
+    """Build the episodes of a derived subscription from the media already
+    downloaded by its source subscription, without fetching anything.
+
+    Media is hardlinked when the source file already has the wanted format,
+    otherwise its streams are copied or transcoded locally with ffmpeg.
+    """
+    downloaded = []
+    src_snapshot = sub_snapshot(source)
+    src_index = episode_index(source)
+    index = episode_index(sub)
+    failures = failure_queue(sub)
+    # Newest first, as the extractor lists playlists, by the upload dates of
+    # the source index rather than parsing every source .info.json
+    records = sorted(
+        (
+            record
+            for record in src_index.entries.values()
+            if record["media"] is not None and src_snapshot.isfile(record["media"])
+        ),
+        key=lambda record: str(record.get("upload_date") or ""),
+        reverse=True,
+    )
+    loaded = {}
+
+    def _candidates():
+        for record in records:
+            if _derived(sub, index, record["id"]):
+                # Still counts for download_last, without loading its metadata
+                yield {"id": record["id"], "upload_date": record.get("upload_date")}
+                continue
+            suffix, md = _episode_metadata(src_snapshot, record["basename"])
+            if md is not None and md.get("upload_date") is not None:
+                loaded[md["id"]] = (record, suffix)
+                yield md
+
+    filters = compile_filters(sub.get("filters"))
+    if sub["retention_days"] is not None and not sub["initialize"]:
+        after = (date.today() - timedelta(days=sub["retention_days"])).strftime("%Y%m%d")
+        filters.append(
+            ("retention_days", lambda md: md["upload_date"] is None or str(md["upload_date"]) >= after)
+        )
+    dropped = {}
+    selected = apply_filters(_candidates(), filters, dropped)
+    if sub["download_last"] is not None and not sub["initialize"]:
+        selected = itertools.islice(selected, sub["download_last"])
+
+    os.makedirs(sub_dir(sub), exist_ok=True)
+    if not os.path.isfile(sub_dir(sub, "icon.jpg")) and src_snapshot.isfile("icon.jpg"):
+        link_or_copy(src_snapshot.path("icon.jpg"), sub_dir(sub, "icon.jpg"))
+    try:
+        for md in selected:
+            if md["id"] not in loaded:
+                continue
+            record, suffix = loaded[md["id"]]
+            if _failure_pending(sub, failures, md):
+                continue
+            entry = _derive_episode(sub, source, src_snapshot, record, suffix, md, failures)
+            if entry is not None:
+                index.record(
+                    entry["id"],
+                    record["basename"],
+                    os.path.basename(entry["_filename"]),
+                    size=os.path.getsize(entry["_filename"]),
+                    upload_date=entry.get("upload_date"),
                 )
+                downloaded.append(entry)
+    finally:
+        failures.save()
+        if dropped:
+            print(
+                "Filtered out of %s: %s"
+                % (sub["name"], ", ".join("%d by %s" % (count, name) for name, count in sorted(dropped.items())))
             )
-            if sub["download_last"] is not None and i > sub["download_last"]:
-                break
     return downloaded
 
 
-def cleanup(sub):
-    deleted = []
+def ffmpeg_path(sub):
+    """ffmpeg binary, honoring the ffmpeg_location youtube-dl option."""
+    location = (sub.get("ydl_options") or {}).get("ffmpeg_location")
+    if location is None:
+        return "ffmpeg"
+    return os.path.join(location, "ffmpeg") if os.path.isdir(location) else location
+
+
+def _derive_episode(sub, source, src_snapshot, record, suffix, md, failures):
+    basename = record["basename"]
+    src = src_snapshot.path(record["media"])
+    fmt = sub.get("format", "best") if sub["audio_only"] else sub.get("format")
+    if not sub["quiet"]:
+        print("Deriving {} - {} from {}".format(md["id"], md.get("title"), source["name"]))
+    try:
+        media = derive_media(
+            src,
+            sub_dir(sub, basename),
+            sub["audio_only"],
+            fmt,
+            acodec=md.get("acodec"),
+            vcodec=md.get("vcodec"),
+            ffmpeg=ffmpeg_path(sub),
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        error = str(e)
+        if isinstance(e, subprocess.CalledProcessError) and e.stderr:
+            error = "%s: %s" % (error, e.stderr.decode(errors="replace").strip().splitlines()[-1])
+        print("Derivation failed for %s: %s" % (md["id"], error))
+        _record_failure(sub, failures, md["id"], md, error)
+        return None
+    failures.remove(md["id"])
+
+    ext = media.rsplit(".", 1)[-1]
+    entry = {**md, "ext": ext, "_filename": media, "subscription_name": sub["name"]}
+    if sub["audio_only"]:
+        entry["format"] = "audio only"
+        entry["vcodec"] = "none"
+    for name in src_snapshot.group(basename):
+        if name.rsplit(".", 1)[-1] in ["jpg", "jpeg", "png", "webp"]:
+            link_or_copy(src_snapshot.path(name), sub_dir(sub, name))
+    with open(sub_dir(sub, basename + suffix), "w") as f:
+        json.dump(entry if suffix == ".info.json" else {k: entry.get(k) for k in feed_sidecar_fields}, f)
+    if sub.get("slim_sidecar", False) and suffix != ".feed.json":
+        write_feed_sidecar(sub_dir(sub, basename), entry)
+    with open(sub_dir(sub, basename + ".meta"), "w") as f:
+        json.dump(entry, f)
+    return entry
+
+
+def sub_snapshot(sub):
+    return DirSnapshot(sub_dir(sub))
+
+
+def sub_metadata_cache(sub, snapshot):
+    if snapshot.metadata_cache is None:
+        snapshot.metadata_cache = MetadataCache(sub_state_path(sub, "metadata.json"))
+    return snapshot.metadata_cache
+
+
+def parse_sub_metadata(sub, snapshot=None, strict=True):
+    """metadata_parse every episode of the subscription, from its .feed.json
+    sidecar if there is one, or from its .info.json.
+
+    Each file is parsed at most once per snapshot, and only when it or its
+    episode files changed since the result was cached. Returns a dict of
+    metadata file name -> metadata. Unless strict, files which can not be
+    parsed map to None instead of raising.
+    """
+    if snapshot is None:
+        snapshot = sub_snapshot(sub)
+    cache = sub_metadata_cache(sub, snapshot)
+    names = snapshot.endswith(".feed.json") + [
+        name
+        for name in snapshot.endswith(".info.json")
+        if not snapshot.isfile("%s.feed.json" % name[: -len(".info.json")])
+    ]
+    for name in names:
+        if name in snapshot.parsed:
+            continue
+        cached = cache.get(name, cache.key(snapshot, name))
+        if cached is None:
+            try:
+                md = metadata_parse(snapshot.path(name), snapshot)
+            except (ValueError, KeyError, TypeError):
+                if strict:
+                    raise
+                continue
+            # Keyed after parsing, as it may add a converted thumbnail to the group
+            cached = cache.set(name, cache.key(snapshot, name), md)
+        snapshot.parsed[name] = cached["md"]
+    cache.prune(names)
+    cache.save()
+    return {name: snapshot.parsed.get(name) for name in names}
+
+
+def retention_policy(sub):
+    return {
+        "retention_days": sub["retention_days"],
+        "keep_last": sub.get("keep_last"),
+        "max_bytes": sub.get("max_bytes"),
+    }
+
+
+def cleanup(sub, snapshot=None):
+    """Delete the episodes falling out of the retention policy of the
+    subscription, each with all its files."""
     directory = sub_dir(sub)
     if not os.path.isdir(directory):
-        return deleted
-    for f in os.listdir(directory):
-        fpath = os.path.join(directory, f)
-        mtime = date.fromtimestamp(os.path.getmtime(fpath))
-        ret = date.today() - timedelta(days=sub["retention_days"])
-        if mtime < ret:
-            os.remove(fpath)
-            deleted.append(fpath)
+        return []
+    if snapshot is None:
+        snapshot = sub_snapshot(sub)
+    groups = episode_groups(snapshot, parse_sub_metadata(sub, snapshot, strict=False))
+    return remove_episodes(sub, snapshot, plan_retention(groups, **retention_policy(sub)))
+
+
+def remove_episodes(sub, snapshot, groups):
+    """Delete the files of episode groups, and retire them in the index so
+    that they are not downloaded again, freeing their shared objects no other
+    subscription links to."""
+    deleted = []
+    for group in groups:
+        for name in group["files"]:
+            os.remove(snapshot.path(name))
+            snapshot.remove(name)
+            deleted.append(snapshot.path(name))
+    if any(f.endswith(".meta") for f in deleted):
+        index = episode_index(sub)
+        store = object_store(sub)
+        for f in deleted:
+            if f.endswith(".meta"):
+                basename = os.path.basename(f)[: -len(".meta")]
+                for record in [r for r in index.entries.values() if r["basename"] == basename]:
+                    if store is not None and record.get("store") is not None:
+                        store.release(record["store"])
+                index.retire_basename(basename)
     return deleted
 
 
-def write_sub_nfo(sub):
+def disk_usage_index(subs, policy="oldest"):
+    """Downloaded episodes of subs as eviction candidates, read from their
+    episode index rather than walking the directories. Episodes sharing the
+    same media inode (linked from the shared store or by a derived
+    subscription) are one candidate, counted once, as they only free space
+    together."""
+    candidates = {}
+    for sub in subs:
+        for record in episode_index(sub).entries.values():
+            if record["media"] is None or record.get("size") is None:
+                continue
+            try:
+                stat = os.stat(sub_dir(sub, record["media"]))
+            except OSError:
+                stat = None
+            if stat is not None:
+                key = (stat.st_dev, stat.st_ino)
+            else:
+                key = record.get("store") or (sub["name"], record["basename"])
+            candidate = candidates.get(key)
+            if candidate is None:
+                candidate = candidates[key] = {
+                    "sub": sub["name"],
+                    "size": record["size"],
+                    "age": None,
+                    "atime": None,
+                    "episodes": [],
+                }
+            candidate["episodes"].append((sub, record))
+            if record.get("upload_date") is not None and candidate["age"] is None:
+                candidate["age"] = datetime.datetime.strptime(str(record["upload_date"]), "%Y%m%d").timestamp()
+            if stat is None:
+                continue
+            if policy == "lru":
+                candidate["atime"] = max(candidate["atime"] or 0, stat.st_atime)
+            if candidate["age"] is None:
+                candidate["age"] = stat.st_mtime
+    return [c for c in candidates.values() if c["age"] is not None]
+
+
+def enforce_disk_budget(config):
+    """Evict whole episodes across all the subscriptions of config until their
+    media fits in its disk_budget, in the order of its eviction_policy, and
+    rewrite the feeds of the subscriptions which lost episodes.
+
+    Evicted episodes are deleted with all their files, subtitles included,
+    and retired in their index so that the next run does not fetch them
+    again."""
+    budget = config.get("disk_budget")
+    if budget is None:
+        return []
+    subs = [sub for sub in (prepare_sub(config, s) for s in config.get("subscriptions") or []) if sub is not None]
+    policy = config.get("eviction_policy", "oldest")
+    evicted = plan_eviction(
+        disk_usage_index(subs, policy),
+        int(budget),
+        policy,
+        {sub["name"]: sub.get("eviction_weight", 1) for sub in subs},
+    )
+    deleted = []
+    snapshots = {}
+    for candidate in evicted:
+        for sub, record in candidate["episodes"]:
+            if sub["name"] not in snapshots:
+                snapshots[sub["name"]] = sub_snapshot(sub)
+            snapshot = snapshots[sub["name"]]
+            group = {"files": [n for n in snapshot.group(record["basename"]) if not is_protected(n)]}
+            deleted += remove_episodes(sub, snapshot, [group])
+    # Drop the evicted episodes from the feeds already written
+    for sub in subs:
+        if sub["name"] in snapshots:
+            write_xml(config, sub, snapshots[sub["name"]])
+    if evicted:
+        print(
+            "Disk budget of %d bytes exceeded: evicted %d episode(s), %d bytes freed"
+            % (int(budget), len(evicted), sum(c["size"] for c in evicted))
+        )
+    return deleted
+
+
+def write_sub_nfo(sub, snapshot=None):
     if not sub.get('nfo_files', False) or sub.get("audio_only", False):
         return
     print("Writing NFO files for %s" % sub["name"])
@@ -363,81 +1547,115 @@ def write_sub_nfo(sub):
     nso_file = sub_dir(sub, "tvshow.nfo")
     pretty_name = sub.get("pretty_name", sub["name"])
 
-    if not os.path.exists(nso_file):
-        with open(nso_file, "w+") as fout:
-            fout.write(Template(SHOW_NFO_TMPL).render({
-                "title": pretty_name
-            }))
+    if snapshot is None:
+        snapshot = sub_snapshot(sub)
 
-    info_json_glob = sub_dir(sub, "*.info.json")
-    mds = [
-        metadata_parse(md_file)
-        for md_file in glob.glob(info_json_glob)
-    ]
+    if not snapshot.isfile("tvshow.nfo"):
+        render_to_file(get_template("tvshow.nfo", sub), nso_file, {"title": pretty_name}, "w+")
+
+    mds = parse_sub_metadata(sub, snapshot).values()
+    template = get_template("episode.nfo", sub)
 
     for md in mds:
         if md is None:
             continue
-        nfo_file = sub_dir(sub, "%s.nfo" % ".".join(md["filename"].split(".")[:-1]))
+        nfo_name = "%s.nfo" % ".".join(md["filename"].split(".")[:-1])
+        nfo_file = sub_dir(sub, nfo_name)
         ep_date = datetime.datetime.strptime(md["pub_date"], "%a, %d %b %Y %H:%M:%S +0000").strftime("%Y-%m-%d")
-        if not os.path.exists(nfo_file):
-            with open(nfo_file, "w+") as fout:
-                fout.write(Template(EPISODE_NFO_TMPL).render({
-                    "title": md["title"],
-                    "ep_date": ep_date,
-                    "show_title": pretty_name,
-                    "duration": md["duration"],
-                }))
+        if not snapshot.isfile(nfo_name):
+            render_to_file(template, nfo_file, {
+                "title": md["title"],
+                "ep_date": ep_date,
+                "show_title": pretty_name,
+                "duration": md["duration"],
+            }, "w+")
+
+
+def artwork(sub, filename, snapshot=None):
+    """Resized copy of an image at the first of the thumbnail_sizes of the
+    subscription when there is one, the image itself otherwise."""
+    sizes = sub.get("thumbnail_sizes")
+    if sizes and snapshot is not None:
+        sized = sized_name(filename.rsplit(".", 1)[0], int(sizes[0]))
+        if snapshot.isfile(sized):
+            return sized
+    return filename
 
 
-def write_xml(config, sub):
+def write_sub_thumbnails(sub, snapshot=None):
+    """Convert the thumbnails of a subscription to jpg and to its
+    thumbnail_sizes in a pool, ahead of the metadata parsing."""
+    if snapshot is None:
+        snapshot = sub_snapshot(sub)
+    written = write_thumbnails(
+        snapshot,
+        sub.get("thumbnail_sizes") or (),
+        sub.get("thumbnail_quality"),
+        sub.get("thumbnail_workers"),
+    )
+    if written:
+        print("Converted %d thumbnail(s) for %s" % (len(written), sub["name"]))
+    return written
+
+
+def feed_item(sub, md, snapshot=None):
+    return {
+        "id": md["id"],
+        "title": md["title"],
+        "url": sub_url(sub, md["filename"]),
+        "media_type": ("audio/%s" % md["extension"])
+        if sub["audio_only"]
+        else "video/%s" % md["extension"],
+        "pubDate": md["pub_date"],
+        "timestamp": md["timestamp"],
+        "thumbnail": sub_url(sub, artwork(sub, md["thumbnail"], snapshot)) if md.get("thumbnail") is not None else None,
+        "description": md.get("description", None),
+        "duration": md.get("duration", None),
+    }
+
+
+def write_xml(config, sub, snapshot=None):
+    if snapshot is None:
+        snapshot = sub_snapshot(sub)
     if sub.get("xml_include_files") == 'all':
         mds = [
             {
-                "id": os.path.basename(f),
-                "title": '.'.join(os.path.basename(f).split('.')[:-1]),
-                "filename":  os.path.basename(f),
-                "extension": os.path.basename(f).split('.')[-1],
-                "pub_date": date.fromtimestamp(os.path.getmtime(f)),
-                "timestamp": date.fromtimestamp(os.path.getmtime(f)),
+                "id": f,
+                "title": '.'.join(f.split('.')[:-1]),
+                "filename":  f,
+                "extension": f.split('.')[-1],
+                "pub_date": date.fromtimestamp(snapshot.stat(f).st_mtime),
+                "timestamp": date.fromtimestamp(snapshot.stat(f).st_mtime),
             }
-            for f in glob.glob(
-                sub_dir(sub, "*.*")
-            ) if os.path.basename(f).split('.')[-1] not in ["json", "jpg", "webp", "meta", "part", "ytdl"]
+            for f in snapshot.names()
+            if "." in f and not f.startswith(".") and f.split('.')[-1] not in ["json", "jpg", "webp", "meta", "part", "ytdl"]
         ]
+        items = [feed_item(sub, md, snapshot) for md in mds]
     else:
-        mds = [
-            metadata_parse(md_file)
-            for md_file in glob.glob(sub_dir(sub, "*.info.json"))
-        ]
+        items = []
+        cache = sub_metadata_cache(sub, snapshot)
+        item_key = [sub["url_root"], sub["name"], sub["audio_only"], sub.get("thumbnail_sizes")]
+        for name, md in parse_sub_metadata(sub, snapshot).items():
+            if not md:
+                continue
+            item = cache.item(name, item_key)
+            if item is None:
+                item = feed_item(sub, md, snapshot)
+                cache.set_item(name, item_key, item)
+            items.append(item)
+        cache.save()
 
     tmpl_args = {
         "last_update": datetime.datetime.now(),
         "channel_title": sub["name"],
         "channel_link": sub.get("url", ""),
         "style_rss_feed": config.get("style_rss_feed", True),
-        "items": [
-            {
-                "id": md["id"],
-                "title": md["title"],
-                "url": sub_url(sub, md["filename"]),
-                "media_type": ("audio/%s" % md["extension"])
-                if sub["audio_only"]
-                else "video/%s" % md["extension"],
-                "pubDate": md["pub_date"],
-                "timestamp": md["timestamp"],
-                "thumbnail": sub_url(sub, md["thumbnail"]) if md.get("thumbnail") is not None else None,
-                "description": md.get("description", None),
-                "duration": md.get("duration", None),
-            }
-            for md in mds if md
-        ],
+        "items": items,
     }
     tmpl_args["items"].sort(key=lambda x: x["timestamp"], reverse=True)
 
-    icon_path = sub_dir(sub, "icon.jpg")
-    if os.path.isfile(icon_path):
-        tmpl_args["icon_url"] = sub_url(sub, "icon.jpg")
+    if snapshot.isfile("icon.jpg"):
+        tmpl_args["icon_url"] = sub_url(sub, artwork(sub, "icon.jpg", snapshot))
 
     new_feed_url = sub.get("new_feed_url")
     if new_feed_url is None and sub.get("new_feed_url_root"):
@@ -445,8 +1663,75 @@ def write_xml(config, sub):
     if new_feed_url:
         tmpl_args["new_feed_url"] = new_feed_url
 
-    with open("%s.xml" % sub_dir(sub), "w") as fout:
-        fout.write(Template(FEED_TMPL).render(**tmpl_args))
+    return write_feed_pages(sub, get_template("feed.xml", sub), tmpl_args)
+
+
+def feed_path(sub, page=None):
+    if page is None:
+        return "%s.xml" % sub_dir(sub)
+    return "%s-page-%d.xml" % (sub_dir(sub), page)
+
+
+def feed_url(sub, page=None):
+    return "/".join([sub["url_root"], quote(os.path.basename(feed_path(sub, page)))])
+
+
+def write_feed_pages(sub, template, tmpl_args):
+    """Write the feed of a subscription, capped to its feed_max_items newest
+    items, the older ones going to RFC 5005 paged archive feeds.
+
+    Pages are numbered from the oldest, so that new items only ever change the
+    newest page; unchanged pages are not rewritten. Returns whether any file
+    was written.
+    """
+    max_items = sub.get("feed_max_items")
+    compress = compress_formats(sub)
+    if not max_items:
+        remove_feed_pages(sub)
+        return render_if_changed(template, feed_path(sub), tmpl_args, compress=compress)
+    max_items = int(max_items)
+    page_size = int(sub.get("feed_page_size") or max_items)
+    items = tmpl_args["items"]
+    archived = items[max_items:][::-1]
+    pages = [archived[i:i + page_size] for i in range(0, len(archived), page_size)]
+    changed = False
+    for number, page_items in enumerate(pages, 1):
+        links = [
+            {"rel": "first", "href": feed_url(sub)},
+            {"rel": "last", "href": feed_url(sub, 1)},
+            {"rel": "previous", "href": feed_url(sub, number + 1 if number < len(pages) else None)},
+        ]
+        if number > 1:
+            links.append({"rel": "next", "href": feed_url(sub, number - 1)})
+        page_args = {**tmpl_args, "items": page_items[::-1], "feed_links": links}
+        changed = render_if_changed(template, feed_path(sub, number), page_args, compress=compress) or changed
+    remove_feed_pages(sub, keep=len(pages))
+    links = [{"rel": "first", "href": feed_url(sub)}]
+    if pages:
+        links += [
+            {"rel": "last", "href": feed_url(sub, 1)},
+            {"rel": "next", "href": feed_url(sub, len(pages))},
+        ]
+    main_args = {**tmpl_args, "items": items[:max_items], "feed_links": links}
+    return render_if_changed(template, feed_path(sub), main_args, compress=compress) or changed
+
+
+def remove_feed_pages(sub, keep=0):
+    """Delete the archive pages of a subscription numbered above keep."""
+    prefix = "%s-page-" % os.path.basename(sub_dir(sub))
+    directory = os.path.dirname(sub_dir(sub))
+    if not os.path.isdir(directory):
+        return []
+    removed = []
+    for name in os.listdir(directory):
+        number = name[len(prefix): -len(".xml")]
+        if name.startswith(prefix) and name.endswith(".xml") and number.isdigit() and int(number) > keep:
+            for path in [os.path.join(directory, name), os.path.join(directory, name + ".headers.json")]:
+                if os.path.exists(path):
+                    os.remove(path)
+            remove_compressed(os.path.join(directory, name))
+            removed.append(os.path.join(directory, name))
+    return removed
 
 
 def get_ydl_module(config):
@@ -457,3 +1742,188 @@ def get_ydl_module(config):
         except ModuleNotFoundError:
             return importlib.import_module("yt_dlp")
     return importlib.import_module(m.replace("-", "_"))
+
+
+def write_style(config):
+    if not config.get("style_rss_feed", True):
+        return
+    if not os.path.exists(config["output_dir"]):
+        print("Creating output directory")
+        os.makedirs(config["output_dir"])
+    if write_if_changed(os.path.join(config["output_dir"], "style.xsl"), FEED_STYLE_TMPL, compress_formats(config)):
+        print("Writing style.xsl")
+
+
+def write_index(config):
+    if not config.get("index_enabled", False):
+        return
+    index_path = os.path.join(config["output_dir"], "index.html")
+    if render_if_changed(get_template("index.html", config), index_path, {
+        'subscriptions': [sub for sub in config["subscriptions"] if not sub.get("private", False)]
+    }, compress=compress_formats(config)):
+        print("Writing ", index_path)
+
+
+def prepare_sub(config, sub):
+    sub = dict(ChainMap(
+        sub,
+        {
+            t: config[t]
+            for t in config.keys()
+            if t in inherited_config_keys
+        },
+        sub_defaults,
+    ))
+    if (
+        "ydl_options" in sub
+        and sub["ydl_options"] is not None
+        and "ydl_options" in config
+        and config["ydl_options"] is not None
+    ):
+        sub["ydl_options"] = {**config["ydl_options"], **sub["ydl_options"]}
+    elif "ydl_options" in config and config["ydl_options"] is not None:
+        sub["ydl_options"] = config["ydl_options"]
+    elif "ydl_options" in sub and sub["ydl_options"] is None:
+        sub["ydl_options"] = {}
+    if (
+        "name" not in sub
+        or (
+            (
+                ("url" not in sub and sub.get("derive_from") is None)
+                or "output_dir" not in sub
+                or "url_root" not in sub
+            )
+            and not sub.get("skip_download", False)
+        )
+    ):
+        return None
+
+    if (
+        os.path.isdir(sub_dir(sub))
+        and sub["initialize"]
+    ):
+        sub["initialize"] = False
+    return sub
+
+
+def process_sub(ydl_mod, config, sub, cache=None):
+    result = {
+        "name": sub["name"],
+        "status": "ok",
+        "downloaded": 0,
+        "deleted": 0,
+        "error": None,
+    }
+    start = time.monotonic()
+    try:
+        if sub.get("derive_from") is not None:
+            source = source_sub(config, sub)
+            if source is None:
+                raise Exception("Source subscription %s not found" % sub["derive_from"])
+            result["downloaded"] = len(derive(sub, source))
+        elif not sub.get("skip_download", False):
+            result["downloaded"] = len(download(ydl_mod, sub, cache) or [])
+
+        # One directory scan shared by the remaining stages
+        snapshot = sub_snapshot(sub)
+        if any(v is not None for v in retention_policy(sub).values()) and not sub["initialize"]:
+            result["deleted"] = len(cleanup(sub, snapshot))
+
+        write_sub_thumbnails(sub, snapshot)
+        write_sub_nfo(sub, snapshot)
+        write_xml(config, sub, snapshot)
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+        print("Subscription %s failed: %s" % (sub["name"], result["error"]))
+    result["duration"] = time.monotonic() - start
+    return result
+
+
+def run_subscriptions(ydl_mod, config, subs):
+    # Subscriptions of a run share the extraction of identical playlists and videos
+    cache = None
+    if len(subs) > 1 and config.get("share_extraction", True):
+        cache = ExtractionCache(ydl_mod)
+    try:
+        results = {}
+        # Make room before downloading, and again as each stage adds episodes
+        enforce_disk_budget(config)
+        for stage in derivation_stages(subs):
+            for sub, result in zip(stage, _run_subscriptions(ydl_mod, config, stage, cache)):
+                results[id(sub)] = result
+            enforce_disk_budget(config)
+        return [results[id(sub)] for sub in subs]
+    finally:
+        if cache is not None:
+            cache.close()
+            print(
+                "Extraction cache: %d playlist(s) and %d video(s) shared, %d extraction(s) saved"
+                % (cache.stats["playlist_hits"], cache.stats["entry_hits"], cache.saved())
+            )
+
+
+def derivation_stages(subs):
+    """Split subs in successive stages, derived subscriptions running in a
+    stage after the one of their source."""
+    names = {sub["name"] for sub in subs}
+    pending = list(subs)
+    done = set()
+    stages = []
+    while pending:
+        stage = [
+            sub for sub in pending
+            if sub.get("derive_from") not in names or sub["derive_from"] in done or sub["derive_from"] == sub["name"]
+        ]
+        # Derivation cycle: run the remaining subscriptions together
+        stage = stage or pending
+        stages.append(stage)
+        done.update(sub["name"] for sub in stage)
+        pending = [sub for sub in pending if sub not in stage]
+    return stages
+
+
+def _run_subscriptions(ydl_mod, config, subs, cache):
+    workers = max(1, int(config.get("max_parallel_subscriptions", 1) or 1))
+    if workers == 1 or len(subs) <= 1:
+        return [process_sub(ydl_mod, config, sub, cache) for sub in subs]
+
+    output = ThreadOutput(sys.stdout)
+
+    def _run(sub):
+        with output.capture():
+            return process_sub(ydl_mod, config, sub, cache)
+
+    stdout = sys.stdout
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_run, subs))
+    finally:
+        sys.stdout = stdout
+
+
+def print_summary(results):
+    failed = [r for r in results if r["status"] != "ok"]
+    print(
+        "Summary: %d subscription(s), %d ok, %d failed, %d episode(s) downloaded, %d file(s) deleted"
+        % (
+            len(results),
+            len(results) - len(failed),
+            len(failed),
+            sum(r["downloaded"] for r in results),
+            sum(r["deleted"] for r in results),
+        )
+    )
+    for r in results:
+        print(
+            "  %s: %s, %d downloaded, %d deleted (%.1fs)%s"
+            % (
+                r["name"],
+                r["status"],
+                r["downloaded"],
+                r["deleted"],
+                r["duration"],
+                " - %s" % r["error"] if r["error"] else "",
+            )
+        )
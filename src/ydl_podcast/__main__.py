@@ -1,16 +1,13 @@
 #! /usr/bin/env python3
 
-import os
 import sys
 from importlib.metadata import version
-from collections import ChainMap
 import argparse
 import json
-from jinja2 import Template
-from ydl_podcast.templates.index import INDEX_HTML_TMPL
-from ydl_podcast.templates.style import FEED_STYLE_TMPL
+import datetime
 
-from . import load_config, write_xml, cleanup, download, sub_defaults, get_ydl_module, write_sub_nfo, sub_dir
+from . import load_config, get_ydl_module, prepare_sub, run_subscriptions, print_summary, write_style, write_index, episode_index, write_sub_sidecars, failure_queue
+from .scheduler import run_daemon, print_schedule
 
 
 def main():
@@ -20,6 +17,12 @@ def main():
     parser.add_argument("-j", "--json-config", help="Configuration string in JSON format", type=str, default="{}")
     parser.add_argument("-f", "--filter", help="Filter subscriptions", type=str, default=None)
     parser.add_argument("-e", "--exclude", help="Exclude subscriptions", type=str, default=None)
+    parser.add_argument("-d", "--daemon", help="Keep running and poll subscriptions on their own schedule", action='store_true')
+    parser.add_argument("--rebuild-index", help="Rebuild the episode index of each subscription from its directory and exit", action='store_true')
+    parser.add_argument("--write-sidecars", help="Write the .feed.json sidecar of every episode missing one and exit", action='store_true')
+    parser.add_argument("--failures", help="List the failed downloads of each subscription and exit", action='store_true')
+    parser.add_argument("--reset-failures", help="Forget the failed downloads of each subscription (all, or a comma separated list of video ids) and exit", type=str, nargs="?", const="", default=None)
+    parser.add_argument("--schedule", help="Show the predicted next poll time of each subscription and exit", action='store_true')
     print(f"ydl-podcast v{version('ydl-podcast')}")
     args = parser.parse_args()
     if args.version:
@@ -40,75 +43,66 @@ def main():
     args.exclude = args.exclude.split(",") if args.exclude is not None else []
 
 
-    if config.get("style_rss_feed", True):
-        if not os.path.exists(config["output_dir"]):
-            print("Creating output directory")
-            os.makedirs(config["output_dir"])
-        with open(os.path.join(config["output_dir"], "style.xsl"), "w") as fout:
-            print("Writing style.xsl")
-            fout.write(FEED_STYLE_TMPL)
+    write_style(config)
 
+    subs = []
     for sub in config["subscriptions"]:
         if args.filter is not None and sub["name"] not in args.filter or sub["name"] in args.exclude:
             print("Skipping subscription", sub["name"])
             continue
-        sub = dict(ChainMap(
-            sub,
-            {
-                t: config[t]
-                for t in config.keys()
-                if t
-                in ["output_dir", "url_root", "best", "format", "filename_template", "new_feed_url_root"]
-            },
-            sub_defaults,
-        ))
-        if (
-            "ydl_options" in sub
-            and sub["ydl_options"] is not None
-            and "ydl_options" in config
-            and config["ydl_options"] is not None
-        ):
-            sub["ydl_options"] = {**config["ydl_options"], **sub["ydl_options"]}
-        elif "ydl_options" in config and config["ydl_options"] is not None:
-            sub["ydl_options"] = config["ydl_options"]
-        elif "ydl_options" in sub and sub["ydl_options"] is None:
-            sub["ydl_options"] = {}
-        if (
-            "name" not in sub
-            or (
-                (
-                    "url" not in sub
-                    or "output_dir" not in sub
-                    or "url_root" not in sub
-                )
-                and not sub.get("skip_download", False)
-            )
-        ):
+        sub = prepare_sub(config, sub)
+        if sub is None:
             print("Skipping erroneous subscription")
             continue
+        subs.append(sub)
+
+    if args.rebuild_index:
+        for sub in subs:
+            print("Rebuilt index of %s: %d episodes" % (sub["name"], len(episode_index(sub).rebuild())))
+        return 0
+
+    if args.write_sidecars:
+        for sub in subs:
+            print("Wrote %d sidecar(s) for %s" % (len(write_sub_sidecars(sub)), sub["name"]))
+        return 0
 
-        if (
-            os.path.isdir(sub_dir(sub))
-            and sub["initialize"]
-        ):
-            sub["initialize"] = False
+    if args.failures:
+        for sub in subs:
+            for video_id, failure in failure_queue(sub).entries.items():
+                print(
+                    "%s: %s (%s) - %d attempt(s), %s, last error: %s"
+                    % (
+                        sub["name"],
+                        video_id,
+                        failure.get("title"),
+                        failure["attempts"],
+                        "gave up" if failure["gave_up"] else "next attempt after %s" % datetime.datetime.fromtimestamp(failure["next_eligible"]).isoformat(timespec="seconds"),
+                        failure["last_error"],
+                    )
+                )
+        return 0
+
+    if args.reset_failures is not None:
+        video_ids = args.reset_failures.split(",") if args.reset_failures else None
+        for sub in subs:
+            failures = failure_queue(sub)
+            reset = failures.reset(video_ids)
+            failures.save()
+            print("Reset %d failed download(s) of %s" % (len(reset), sub["name"]))
+        return 0
 
-        if not sub.get("skip_download", False):
-            download(ydl_mod, sub)
+    if args.schedule:
+        return print_schedule(subs)
 
-        if sub["retention_days"] is not None and not sub["initialize"]:
-            cleanup(sub)
+    if args.daemon:
+        return run_daemon(ydl_mod, config, subs)
 
-        write_sub_nfo(sub)
-        write_xml(config, sub)
+    results = run_subscriptions(ydl_mod, config, subs)
+    write_index(config)
 
-    if config.get("index_enabled", False):
-        index_path = os.path.join(config["output_dir"], "index.html")
-        with open(index_path, "w") as fout:
-            print("Writing ", index_path)
-            fout.write(Template(INDEX_HTML_TMPL).render({
-                'subscriptions': [sub for sub in config["subscriptions"] if not sub.get("private", False)]
-                }))
+    print_summary(results)
+    if any(r["status"] != "ok" for r in results):
+        return 1
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensions of the precompressed siblings, as looked up by gzip_static/brotli_static
+compressed_extensions = ["gz", "br"]
+
+
+def compress_formats(settings):
+    """Precompressed siblings to write according to the precompress setting:
+    True for all the available formats, or a list of extensions."""
+    value = settings.get("precompress", False)
+    if not value:
+        return []
+    formats = compressed_extensions if value is True else value
+    return [f for f in formats if f == "gz" or (f == "br" and brotli is not None)]
+
+
+def _compress_file(path, dst, ext, chunk_size=1 << 16):
+    with open(path, "rb") as src:
+        if ext == "gz":
+            # mtime=0 so that unchanged content compresses to identical bytes
+            with open(dst, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=9, mtime=0) as out:
+                for chunk in iter(lambda: src.read(chunk_size), b""):
+                    out.write(chunk)
+            return
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT)
+        with open(dst, "wb") as out:
+            for chunk in iter(lambda: src.read(chunk_size), b""):
+                out.write(compressor.process(chunk))
+            out.write(compressor.finish())
+
+
+def write_compressed(path, formats, changed=True):
+    """Write the precompressed siblings of path in formats, when path changed
+    or they are missing, and remove the siblings of the other formats so that
+    no stale copy is served."""
+    written = []
+    for ext in compressed_extensions:
+        sibling = "%s.%s" % (path, ext)
+        if ext not in formats:
+            if os.path.exists(sibling):
+                os.remove(sibling)
+            continue
+        if not changed and os.path.isfile(sibling):
+            continue
+        tmp_path = "%s.tmp" % sibling
+        _compress_file(path, tmp_path, ext)
+        os.replace(tmp_path, sibling)
+        written.append(sibling)
+    return written
+
+
+def remove_compressed(path):
+    for ext in compressed_extensions:
+        if os.path.exists("%s.%s" % (path, ext)):
+            os.remove("%s.%s" % (path, ext))
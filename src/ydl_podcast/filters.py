@@ -0,0 +1,63 @@
+import re
+import datetime
+
+
+def _upload_date(entry):
+    if entry.get("upload_date"):
+        return str(entry["upload_date"])
+    if entry.get("timestamp") is not None:
+        return datetime.datetime.fromtimestamp(entry["timestamp"], datetime.timezone.utc).strftime("%Y%m%d")
+    return None
+
+
+def _is_live(entry):
+    if entry.get("is_live") is not None:
+        return bool(entry["is_live"])
+    if entry.get("live_status") is not None:
+        return entry["live_status"] in ("is_live", "is_upcoming")
+    return None
+
+
+def compile_filters(spec):
+    """Compile the `filters` setting of a subscription into a list of
+    (name, predicate) pairs applied to flat playlist entries.
+
+    A predicate returns False to drop the entry. Entries lacking the field a
+    filter looks at are kept, the per-entry extraction deciding for them.
+    """
+    filters = []
+    spec = spec or {}
+    if spec.get("title") is not None:
+        pattern = re.compile(spec["title"], re.IGNORECASE)
+        filters.append(("title", lambda e: e.get("title") is None or pattern.search(e["title"]) is not None))
+    if spec.get("exclude_title") is not None:
+        exclude = re.compile(spec["exclude_title"], re.IGNORECASE)
+        filters.append(("exclude_title", lambda e: e.get("title") is None or exclude.search(e["title"]) is None))
+    if spec.get("min_duration") is not None:
+        min_duration = float(spec["min_duration"])
+        filters.append(("min_duration", lambda e: e.get("duration") is None or e["duration"] >= min_duration))
+    if spec.get("max_duration") is not None:
+        max_duration = float(spec["max_duration"])
+        filters.append(("max_duration", lambda e: e.get("duration") is None or e["duration"] <= max_duration))
+    if spec.get("is_live") is not None:
+        is_live = bool(spec["is_live"])
+        filters.append(("is_live", lambda e: _is_live(e) is None or _is_live(e) == is_live))
+    if spec.get("after") is not None:
+        after = str(spec["after"])
+        filters.append(("after", lambda e: _upload_date(e) is None or _upload_date(e) >= after))
+    if spec.get("before") is not None:
+        before = str(spec["before"])
+        filters.append(("before", lambda e: _upload_date(e) is None or _upload_date(e) <= before))
+    return filters
+
+
+def apply_filters(entries, filters, dropped):
+    """Yield the entries passing all filters, counting in dropped the entries
+    rejected by each filter."""
+    for entry in entries:
+        for name, predicate in filters:
+            if not predicate(entry):
+                dropped[name] = dropped.get(name, 0) + 1
+                break
+        else:
+            yield entry
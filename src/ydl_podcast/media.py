@@ -0,0 +1,118 @@
+import os
+import shutil
+import subprocess
+
+# Container used when copying an audio stream without re-encoding it
+audio_codec_extensions = {
+    "aac": "m4a",
+    "mp4a": "m4a",
+    "m4a": "m4a",
+    "opus": "opus",
+    "vorbis": "ogg",
+    "mp3": "mp3",
+    "flac": "flac",
+    "wav": "wav",
+}
+
+# ffmpeg encoder used when transcoding to an audio format
+audio_encoders = {
+    "aac": "aac",
+    "m4a": "aac",
+    "opus": "libopus",
+    "vorbis": "libvorbis",
+    "mp3": "libmp3lame",
+    "flac": "flac",
+    "wav": "pcm_s16le",
+}
+
+
+def _codec(name):
+    """Normalize a codec name from an info dict (eg. mp4a.40.2 -> aac)."""
+    if not name or name == "none":
+        return None
+    name = name.split(".")[0].lower()
+    return "aac" if name in ("mp4a", "m4a") else name
+
+
+def link_or_copy(src, dst):
+    """Hardlink src to dst, copying it when linking is not possible."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def plan_media(src, audio_only, fmt=None, acodec=None, vcodec=None):
+    """Decide how to get the media of a derived episode out of src.
+
+    Returns the target extension and the action: "link" when src can be used
+    as-is, "copy" to extract/remux streams without re-encoding them, or
+    "encode" to transcode the audio.
+    """
+    source_ext = src.rsplit(".", 1)[-1]
+    fmt = None if fmt in (None, "best") else fmt
+    if not audio_only:
+        ext = fmt or source_ext
+        return ext, "link" if ext == source_ext else "copy"
+    acodec = _codec(acodec)
+    audio_file = _codec(vcodec) is None and vcodec is not None
+    if fmt is None:
+        if acodec not in audio_codec_extensions:
+            return "mp3", "encode"
+        ext = audio_codec_extensions[acodec]
+    else:
+        ext = audio_codec_extensions.get(fmt, fmt)
+        if _codec(fmt) != acodec:
+            return ext, "encode"
+    return ext, "link" if audio_file and ext == source_ext else "copy"
+
+
+def ffmpeg_args(action, audio_only, ext, quality="5"):
+    if action == "copy":
+        return ["-vn", "-c:a", "copy"] if audio_only else ["-map", "0", "-c", "copy"]
+    args = ["-vn", "-c:a", audio_encoders.get(ext, audio_encoders.get(_codec(ext), ext))]
+    if ext in ("mp3", "ogg", "vorbis") and quality is not None:
+        args += ["-q:a", str(quality)]
+    return args
+
+
+def priority_prefix(nice=None, ionice=None):
+    """Command prefix running a process at a lower CPU (nice) and IO (ionice
+    class) priority, skipping the tools missing from the system."""
+    prefix = []
+    if ionice is not None and shutil.which("ionice"):
+        prefix += ["ionice", "-c", str(ionice)]
+    if nice and shutil.which("nice"):
+        prefix += ["nice", "-n", str(nice)]
+    return prefix
+
+
+def derive_media(
+    src, dst_basename, audio_only, fmt=None, acodec=None, vcodec=None, quality="5", ffmpeg="ffmpeg",
+    nice=None, ionice=None,
+):
+    """Produce the media of a derived episode at dst_basename.<ext> from the
+    already downloaded src, by hardlink, stream copy or local transcode.
+
+    Returns the path of the resulting file. ffmpeg writes to a hidden
+    temporary file, renamed once complete.
+    """
+    ext, action = plan_media(src, audio_only, fmt, acodec, vcodec)
+    dst = "%s.%s" % (dst_basename, ext)
+    if action == "link":
+        if os.path.abspath(dst) != os.path.abspath(src):
+            link_or_copy(src, dst)
+        return dst
+    directory, name = os.path.split(dst_basename)
+    tmp = os.path.join(directory, ".%s.tmp.%s" % (name, ext))
+    command = priority_prefix(nice, ionice) + [ffmpeg, "-y", "-loglevel", "error", "-i", src] + ffmpeg_args(action, audio_only, ext, quality) + [tmp]
+    try:
+        subprocess.run(command, check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, dst)
+    return dst
@@ -0,0 +1,67 @@
+import io
+import sys
+import functools
+import threading
+from contextlib import contextmanager
+
+
+class ThreadOutput(io.TextIOBase):
+    """stdout proxy buffering each worker thread's output so that parallel
+    subscriptions print as contiguous blocks instead of interleaved lines."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is not None:
+            return buffer.write(s)
+        with self._lock:
+            return self._stream.write(s)
+
+    def flush(self):
+        with self._lock:
+            self._stream.flush()
+
+    @contextmanager
+    def capture(self):
+        self._local.buffer = io.StringIO()
+        try:
+            yield
+        finally:
+            output = self._local.buffer.getvalue()
+            self._local.buffer = None
+            with self._lock:
+                self._stream.write(output)
+                self._stream.flush()
+
+    def inherit(self, fn):
+        """Wrap fn so that it writes to the buffer of the calling thread from
+        whichever thread runs it."""
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            return fn
+
+        @functools.wraps(fn)
+        def _run(*args, **kwargs):
+            previous = getattr(self._local, "buffer", None)
+            self._local.buffer = buffer
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.buffer = previous
+
+        return _run
+
+
+def inherit_output(fn):
+    """Wrap fn, to be run by a pool thread, so that its output joins the
+    captured output of the subscription submitting it."""
+    if isinstance(sys.stdout, ThreadOutput):
+        return sys.stdout.inherit(fn)
+    return fn
@@ -0,0 +1,117 @@
+import datetime
+
+from .state import anchor_stem
+
+# Files of a subscription directory which are not part of any episode
+protected_files = ["icon.jpg", "tvshow.nfo"]
+
+
+def is_protected(name):
+    """Whether name is a show file, or a resized copy of the show icon."""
+    return name in protected_files or (name.startswith("icon.") and name.endswith(".jpg"))
+
+
+# Files of an episode still being downloaded
+partial_extensions = ["part", "ytdl"]
+
+
+def episode_groups(snapshot, mds=None):
+    """Group the files of a snapshot by episode, with the size of each group
+    and its age: the upload time from its metadata when known, the newest
+    mtime of its files otherwise.
+
+    mds maps metadata file names to their parsed metadata (see
+    parse_sub_metadata).
+    """
+    uploaded = {}
+    for name, md in (mds or {}).items():
+        if md is not None and md.get("timestamp") is not None:
+            uploaded[anchor_stem(name)] = md["timestamp"]
+    groups = []
+    for basename, names in snapshot.groups.items():
+        names = [n for n in names if not is_protected(n) and not n.startswith(".")]
+        if not names:
+            continue
+        stats = [snapshot.stat(n) for n in names]
+        groups.append({
+            "basename": basename,
+            "files": list(names),
+            "size": sum(s.st_size for s in stats),
+            "mtime": max(s.st_mtime for s in stats),
+            "uploaded": uploaded.get(basename),
+            "partial": any(n.rsplit(".", 1)[-1] in partial_extensions for n in names),
+        })
+    return groups
+
+
+def group_age(group):
+    return group["uploaded"] if group["uploaded"] is not None else group["mtime"]
+
+
+def plan_retention(groups, retention_days=None, keep_last=None, max_bytes=None, today=None):
+    """Episode groups to delete, applying in turn: groups older than
+    retention_days, all but the keep_last newest, then the oldest until the
+    total size fits in max_bytes.
+
+    Episodes still being downloaded only expire by age.
+    """
+    today = today or datetime.date.today()
+    delete = []
+    kept = sorted(groups, key=group_age, reverse=True)
+    if retention_days is not None:
+        limit = today - datetime.timedelta(days=retention_days)
+        delete += [g for g in kept if datetime.date.fromtimestamp(group_age(g)) < limit]
+        kept = [g for g in kept if g not in delete]
+    complete = [g for g in kept if not g["partial"]]
+    if keep_last is not None:
+        delete += complete[int(keep_last):]
+        complete = complete[: int(keep_last)]
+    if max_bytes is not None:
+        total = sum(g["size"] for g in kept if g not in delete)
+        while complete and total > max_bytes:
+            group = complete.pop()
+            delete.append(group)
+            total -= group["size"]
+    return delete
+
+
+eviction_policies = ["oldest", "lru", "weighted"]
+
+
+def plan_eviction(candidates, budget, policy="oldest", weights=None):
+    """Episodes to evict across subscriptions until the total size of
+    candidates fits in budget.
+
+    Each candidate has a size, the name of its subscription (sub), its upload
+    time (age) and last access time (atime). "oldest" evicts by upload time,
+    "lru" by last access, and "weighted" the oldest episode of the
+    subscription using the most space relative to its weight.
+    """
+    if policy not in eviction_policies:
+        raise ValueError("Unknown eviction policy %s" % policy)
+    total = sum(c["size"] for c in candidates)
+    evicted = []
+    if total <= budget:
+        return evicted
+    if policy != "weighted":
+        key = "atime" if policy == "lru" else "age"
+        for candidate in sorted(candidates, key=lambda c: c[key]):
+            if total <= budget:
+                break
+            evicted.append(candidate)
+            total -= candidate["size"]
+        return evicted
+    weights = weights or {}
+    by_sub = {}
+    for candidate in sorted(candidates, key=lambda c: c["age"]):
+        by_sub.setdefault(candidate["sub"], []).append(candidate)
+    usage = {sub: sum(c["size"] for c in group) for sub, group in by_sub.items()}
+    while total > budget and by_sub:
+        sub = max(by_sub, key=lambda s: usage[s] / float(weights.get(s, 1) or 1))
+        candidate = by_sub[sub].pop(0)
+        if not by_sub[sub]:
+            del by_sub[sub]
+        usage[sub] -= candidate["size"]
+        evicted.append(candidate)
+        total -= candidate["size"]
+    return evicted
@@ -0,0 +1,195 @@
+import os
+import json
+import heapq
+import random
+import signal
+import threading
+import time
+import datetime
+
+from . import run_subscriptions, print_summary, write_index, sub_dir
+
+poll_defaults = {
+    "poll_interval": 3600,
+    "poll_jitter": 0.1,
+    "poll_backoff": 2,
+    "poll_max_interval": 86400,
+    "poll_adaptive": False,
+    "poll_min_interval": 900,
+    "poll_adaptive_window": 10,
+    "poll_per_upload": 4,
+}
+
+
+def poll_setting(sub, key):
+    value = sub.get(key)
+    return poll_defaults[key] if value is None else value
+
+
+class UploadHistory:
+    """Upload times of the episodes of a subscription, read from its
+    .feed.json/.info.json/.meta files and cached by file mtime."""
+
+    def __init__(self):
+        self._cache = {}
+
+    def _read(self, path, mtime):
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        uploaded = None
+        try:
+            with open(path) as f:
+                md = json.load(f)
+            if md.get("timestamp") is not None:
+                uploaded = float(md["timestamp"])
+            elif md.get("upload_date") is not None:
+                uploaded = datetime.datetime.strptime(md["upload_date"], "%Y%m%d").timestamp()
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+        self._cache[path] = (mtime, uploaded)
+        return uploaded
+
+    def uploads(self, sub):
+        directory = sub_dir(sub)
+        if not os.path.isdir(directory):
+            return []
+        uploads = {}
+        with os.scandir(directory) as entries:
+            for f in entries:
+                for suffix in [".feed.json", ".info.json", ".meta"]:
+                    if f.name.endswith(suffix):
+                        basename = f.name[: -len(suffix)]
+                        break
+                else:
+                    continue
+                if uploads.get(basename) is not None:
+                    continue
+                uploads[basename] = self._read(f.path, f.stat().st_mtime)
+        return sorted(u for u in uploads.values() if u is not None)
+
+
+def adaptive_interval(sub, uploads, now):
+    """Poll interval matching the recent upload cadence of a subscription.
+
+    The mean gap between the last uploads is split in poll_per_upload polls.
+    When the channel has been quiet for longer than that gap, the time since
+    its last upload is used instead, so inactive channels slow down.
+    """
+    window = int(poll_setting(sub, "poll_adaptive_window"))
+    uploads = uploads[-window:]
+    if len(uploads) < 2:
+        return float(poll_setting(sub, "poll_interval"))
+    gap = (uploads[-1] - uploads[0]) / (len(uploads) - 1)
+    gap = max(gap, now - uploads[-1])
+    return gap / float(poll_setting(sub, "poll_per_upload"))
+
+
+class Scheduler:
+    """Keeps track of when each subscription is due for its next poll."""
+
+    def __init__(self, subs, clock=time.time, rand=random.uniform):
+        self._clock = clock
+        self._rand = rand
+        self._heap = []
+        self._seq = 0
+        self.subs = {sub["name"]: sub for sub in subs}
+        self.failures = {sub["name"]: 0 for sub in subs}
+        self.next_poll = {}
+        self.history = UploadHistory()
+        now = self._clock()
+        for sub in subs:
+            self._push(sub["name"], now)
+
+    def _push(self, name, due):
+        self.next_poll[name] = due
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, name))
+
+    def interval(self, sub, jitter=True):
+        if poll_setting(sub, "poll_adaptive"):
+            interval = adaptive_interval(sub, self.history.uploads(sub), self._clock())
+            interval = max(interval, float(poll_setting(sub, "poll_min_interval")))
+        else:
+            interval = float(poll_setting(sub, "poll_interval"))
+        failures = self.failures.get(sub["name"], 0)
+        if failures:
+            interval *= float(poll_setting(sub, "poll_backoff")) ** failures
+        interval = min(interval, float(poll_setting(sub, "poll_max_interval")))
+        amount = float(poll_setting(sub, "poll_jitter"))
+        if jitter and amount:
+            interval *= 1 + self._rand(-amount, amount)
+        return max(interval, 0)
+
+    def predict(self):
+        """Predicted next poll time of each subscription after a poll now,
+        without jitter."""
+        now = self._clock()
+        return {name: now + self.interval(sub, jitter=False) for name, sub in self.subs.items()}
+
+    def next_due(self):
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def pop_due(self, now=None):
+        now = self._clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, name = heapq.heappop(self._heap)
+            due.append(self.subs[name])
+        return due
+
+    def reschedule(self, sub, result, now=None):
+        now = self._clock() if now is None else now
+        if result is not None and result.get("status") != "ok":
+            self.failures[sub["name"]] = self.failures.get(sub["name"], 0) + 1
+        else:
+            self.failures[sub["name"]] = 0
+        self._push(sub["name"], now + self.interval(sub))
+        return self.next_poll[sub["name"]]
+
+
+def print_schedule(subs):
+    scheduler = Scheduler(subs)
+    for name, next_poll in sorted(scheduler.predict().items(), key=lambda x: x[1]):
+        print(
+            "%s: next poll at %s"
+            % (name, datetime.datetime.fromtimestamp(next_poll).isoformat(timespec="seconds"))
+        )
+    return 0
+
+
+def run_daemon(ydl_mod, config, subs, stop_event=None):
+    stop_event = stop_event or threading.Event()
+
+    def _stop(signum, frame):
+        print("Received signal %d, stopping after the current poll" % signum)
+        stop_event.set()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+    scheduler = Scheduler(subs)
+    while not stop_event.is_set():
+        due = scheduler.pop_due()
+        if due:
+            results = run_subscriptions(ydl_mod, config, due)
+            write_index(config)
+            print_summary(results)
+            for sub, result in zip(due, results):
+                # Only the very first poll of a new subscription initializes it
+                if sub["initialize"] and os.path.isdir(sub_dir(sub)):
+                    sub["initialize"] = False
+                next_poll = scheduler.reschedule(sub, result)
+                print(
+                    "Next poll for %s at %s"
+                    % (sub["name"], datetime.datetime.fromtimestamp(next_poll).isoformat(timespec="seconds"))
+                )
+            continue
+        next_due = scheduler.next_due()
+        if next_due is None:
+            break
+        stop_event.wait(max(0, next_due - time.time()))
+    return 0
@@ -0,0 +1,565 @@
+import os
+import errno
+import re
+import json
+import shutil
+import hashlib
+import threading
+
+# Extensions of the files written next to the media file of an episode
+non_media_extensions = ["json", "jpg", "jpeg", "webp", "png", "meta", "part", "ytdl", "nfo"]
+
+_id_re = re.compile(r"\[([^\[\]]+)\]")
+
+
+def sub_state_dir(sub):
+    root = sub.get("state_dir") or os.path.join(sub["output_dir"], ".ydl-podcast")
+    return os.path.join(root, sub["name"])
+
+
+def sub_state_path(sub, filename):
+    return os.path.join(sub_state_dir(sub), filename)
+
+
+def load_state(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_state(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = "%s.tmp" % path
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class EpisodeIndex:
+    """Persistent map of video id -> downloaded episode of a subscription.
+
+    Stored as an append-only JSON lines log, replayed on load and compacted
+    once it grows much larger than the number of live entries.
+    """
+
+    def __init__(self, path, directory):
+        self.path = path
+        self.directory = directory
+        self.entries = {}
+        self._log_lines = 0
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            self._load()
+        else:
+            self.rebuild()
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._log_lines += 1
+                if record.get("deleted"):
+                    self.entries.pop(record["id"], None)
+                else:
+                    self.entries[record["id"]] = record
+
+    def _append(self, record):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self._log_lines += 1
+        if self._log_lines > 2 * len(self.entries) + 100:
+            self._compact()
+
+    def _compact(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = "%s.tmp" % self.path
+        with open(tmp_path, "w") as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.path)
+        self._log_lines = len(self.entries)
+
+    def get(self, video_id):
+        return self.entries.get(video_id)
+
+    def __contains__(self, video_id):
+        return video_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, video_id, basename, media, meta=True, size=None, **extra):
+        record = {
+            "id": video_id,
+            "basename": basename,
+            "media": media,
+            "meta": meta,
+            "size": size,
+        }
+        record.update({k: v for k, v in extra.items() if v is not None})
+        with self._lock:
+            self.entries[video_id] = record
+            self._append(record)
+        return record
+
+    def remove(self, video_id):
+        with self._lock:
+            if self.entries.pop(video_id, None) is not None:
+                self._append({"id": video_id, "deleted": True})
+
+    def retire(self, video_id):
+        """Replace the record of an episode deleted by retention or eviction
+        with a tombstone, so that it is not downloaded again."""
+        with self._lock:
+            record = self.entries.get(video_id)
+            if record is None or record.get("retired"):
+                return
+            tombstone = {
+                "id": video_id,
+                "basename": record["basename"],
+                "media": None,
+                "meta": False,
+                "size": None,
+                "retired": True,
+            }
+            if record.get("upload_date") is not None:
+                tombstone["upload_date"] = record["upload_date"]
+            self.entries[video_id] = tombstone
+            self._append(tombstone)
+
+    def retire_basename(self, basename):
+        for video_id in [k for k, v in self.entries.items() if v["basename"] == basename]:
+            self.retire(video_id)
+
+    def rebuild(self, snapshot=None):
+        """Recreate the index from the .meta files found in the directory."""
+        entries = {}
+        if snapshot is None:
+            snapshot = DirSnapshot(self.directory)
+        for name in snapshot.endswith(".meta"):
+            basename = name[: -len(".meta")]
+            video_id = self._video_id(basename)
+            if video_id is None:
+                continue
+            media = find_media(basename, snapshot.group(basename))
+            entries[video_id] = {
+                "id": video_id,
+                "basename": basename,
+                "media": media,
+                "meta": True,
+                "size": snapshot.stat(media).st_size if media else None,
+            }
+            meta = load_state(os.path.join(self.directory, name))
+            if isinstance(meta, dict):
+                if meta.get("_store") is not None:
+                    entries[video_id]["store"] = meta["_store"]
+                if meta.get("upload_date") is not None:
+                    entries[video_id]["upload_date"] = meta["upload_date"]
+        with self._lock:
+            # Tombstones have no files to be rebuilt from
+            for video_id, record in self.entries.items():
+                if record.get("retired") and video_id not in entries:
+                    entries[video_id] = record
+            self.entries = entries
+            self._compact()
+        return self
+
+    def _video_id(self, basename):
+        for suffix in [".feed.json", ".meta", ".info.json"]:
+            md = load_state(os.path.join(self.directory, basename + suffix))
+            if isinstance(md, dict) and md.get("id") is not None:
+                return md["id"]
+        ids = _id_re.findall(basename)
+        return ids[0] if ids else None
+
+
+def find_media(basename, filenames):
+    """Name of the media file of an episode among filenames, or None."""
+    prefix = basename + "."
+    for name in filenames:
+        if (
+            name.startswith(prefix)
+            and "." not in name[len(prefix):]
+            and name.split(".")[-1] not in non_media_extensions
+        ):
+            return name
+    return None
+
+
+# Suffixes spanning several dots, stripped as a whole to get an episode basename
+compound_suffixes = [".info.json", ".feed.json"]
+
+# Resized artwork, eg. <basename>.1400x1400.jpg
+sized_image_re = re.compile(r"\.(\d+)x(\d+)\.jpg$")
+
+
+def episode_basename(filename):
+    for suffix in compound_suffixes:
+        if filename.endswith(suffix):
+            return filename[: -len(suffix)]
+    sized = sized_image_re.search(filename)
+    if sized is not None:
+        return filename[: sized.start()]
+    return filename.rsplit(".", 1)[0]
+
+
+# Files naming an episode: any other file starting with their stem and a dot
+# (media, thumbnails, subtitles such as <basename>.en.vtt) belongs to it
+anchor_suffixes = [".meta", ".info.json", ".feed.json"]
+
+
+def anchor_stem(filename):
+    for suffix in anchor_suffixes:
+        if filename.endswith(suffix):
+            return filename[: -len(suffix)]
+    return None
+
+
+def group_basename(filename, stems):
+    """Episode basename of filename: the longest of stems it starts with,
+    followed by a dot, or episode_basename for files of unknown episodes."""
+    end = len(filename)
+    while True:
+        end = filename.rfind(".", 0, end)
+        if end <= 0:
+            return episode_basename(filename)
+        if filename[:end] in stems:
+            return filename[:end]
+
+
+class DirSnapshot:
+    """One os.scandir pass over a subscription directory, with the stat result
+    of every file grouped by episode basename."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+        self._groups = None
+        self._stems = set()
+        self.parsed = {}
+        self.metadata_cache = None
+        if os.path.isdir(directory):
+            with os.scandir(directory) as entries:
+                for f in entries:
+                    if f.is_file():
+                        self.add(f.name, f.stat())
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def add(self, name, stat=None):
+        if stat is None:
+            stat = os.stat(self.path(name))
+        new = name not in self.files
+        self.files[name] = stat
+        if not new:
+            return
+        if self._groups is not None:
+            if anchor_stem(name) is not None:
+                # A new metadata file may claim files of other groups
+                self._groups = None
+            else:
+                self._groups.setdefault(group_basename(name, self._stems), []).append(name)
+        if self.parsed and anchor_stem(name) is None:
+            # The parsed metadata of an episode depends on its files, eg. its jpg thumbnail
+            self.groups
+            basename = group_basename(name, self._stems)
+            for suffix in anchor_suffixes:
+                self.parsed.pop(basename + suffix, None)
+
+    def remove(self, name):
+        if self.files.pop(name, None) is None:
+            return
+        self.parsed.pop(name, None)
+        if self._groups is None:
+            return
+        if anchor_stem(name) is not None:
+            self._groups = None
+            return
+        basename = group_basename(name, self._stems)
+        group = self._groups.get(basename, [])
+        if name in group:
+            group.remove(name)
+        if not group:
+            self._groups.pop(basename, None)
+
+    @property
+    def groups(self):
+        """Files grouped by episode basename, computed on first use."""
+        if self._groups is None:
+            self._stems = set(filter(None, map(anchor_stem, self.files)))
+            self._groups = {}
+            for name in self.files:
+                self._groups.setdefault(group_basename(name, self._stems), []).append(name)
+        return self._groups
+
+    def isfile(self, name):
+        return name in self.files
+
+    def stat(self, name):
+        return self.files[name]
+
+    def group(self, basename):
+        return self.groups.get(basename, [])
+
+    def names(self):
+        return list(self.files)
+
+    def endswith(self, suffix):
+        return [name for name in self.files if name.endswith(suffix)]
+
+
+class MetadataCache:
+    """Persistent cache of metadata_parse results and feed items, keyed by the
+    stat of the .info.json and the files of its episode group."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = load_state(path, {})
+        self.dirty = False
+
+    @staticmethod
+    def key(snapshot, name):
+        stat = snapshot.stat(name)
+        return [stat.st_mtime_ns, stat.st_size, sorted(snapshot.group(episode_basename(name)))]
+
+    def get(self, name, key):
+        entry = self.entries.get(name)
+        if entry is None or entry["key"] != key:
+            return None
+        return entry
+
+    def set(self, name, key, md):
+        self.entries[name] = {"key": key, "md": md}
+        self.dirty = True
+        return self.entries[name]
+
+    def item(self, name, item_key):
+        entry = self.entries.get(name)
+        if entry is None or entry.get("item_key") != item_key:
+            return None
+        return entry["item"]
+
+    def set_item(self, name, item_key, item):
+        self.entries[name]["item_key"] = item_key
+        self.entries[name]["item"] = item
+        self.dirty = True
+
+    def prune(self, names):
+        for name in [n for n in self.entries if n not in names]:
+            del self.entries[name]
+            self.dirty = True
+
+    def save(self):
+        if self.dirty:
+            save_state(self.path, self.entries)
+            self.dirty = False
+
+
+class NegativeCache:
+    """Persistent cache of the entries of a subscription which yielded no
+    metadata, with the reason and until when it holds.
+
+    The whole cache is dropped when the fingerprint of the settings deciding
+    which entries are rejected (eg. retention_days, matchtitle) changes.
+    """
+
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        state = load_state(path, {})
+        if state.get("fingerprint") == fingerprint:
+            self.entries = state.get("entries", {})
+        else:
+            self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def get(self, video_id, now):
+        entry = self.entries.get(video_id)
+        if entry is None or entry["expires"] <= now:
+            return None
+        return entry
+
+    def add(self, video_id, reason, detail, expires):
+        with self._lock:
+            self.entries[video_id] = {"reason": reason, "detail": detail, "expires": expires}
+            self.dirty = True
+
+    def remove(self, video_id):
+        with self._lock:
+            if self.entries.pop(video_id, None) is not None:
+                self.dirty = True
+
+    def save(self, now):
+        with self._lock:
+            expired = [k for k, v in self.entries.items() if v["expires"] <= now]
+            for video_id in expired:
+                del self.entries[video_id]
+            if self.dirty or expired:
+                save_state(self.path, {"fingerprint": self.fingerprint, "entries": self.entries})
+                self.dirty = False
+
+
+class FailureQueue:
+    """Persistent record of the failed downloads of a subscription, with the
+    number of attempts, the last error and when the next attempt is allowed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = load_state(path, {})
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def get(self, video_id):
+        return self.entries.get(video_id)
+
+    def record(self, video_id, error, now, backoff, max_attempts, **extra):
+        with self._lock:
+            entry = self.entries.get(video_id) or {"attempts": 0}
+            entry.update(extra)
+            entry["attempts"] += 1
+            entry["last_error"] = error
+            entry["last_attempt"] = now
+            entry["gave_up"] = entry["attempts"] >= max_attempts
+            entry["next_eligible"] = now + backoff * 2 ** (entry["attempts"] - 1)
+            self.entries[video_id] = entry
+            self.dirty = True
+            return entry
+
+    def remove(self, video_id):
+        with self._lock:
+            if self.entries.pop(video_id, None) is not None:
+                self.dirty = True
+
+    def reset(self, video_ids=None):
+        with self._lock:
+            reset = [k for k in self.entries if video_ids is None or k in video_ids]
+            for video_id in reset:
+                del self.entries[video_id]
+            if reset:
+                self.dirty = True
+            return reset
+
+    def save(self):
+        with self._lock:
+            if self.dirty:
+                save_state(self.path, self.entries)
+                self.dirty = False
+
+
+def _safe_name(name):
+    name = re.sub(r"[^\w.-]", "_", str(name))
+    return "_%s" % name if name.startswith(".") or not name else name
+
+
+# os.link errors meaning the files can not be hardlinked into the store
+unshareable_errors = (errno.EXDEV, errno.EPERM, errno.EMLINK)
+
+
+class ObjectStore:
+    """Store of downloaded episodes shared by the subscriptions, keyed by
+    extractor, video id and format.
+
+    Each object is a directory holding the files of one episode (media,
+    .info.json, thumbnail, ...); subscription directories hold hardlinks to
+    them, so an object file with a single link is referenced by nobody.
+    """
+
+    object_basename = "episode"
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, root):
+        self.root = root
+
+    def lock(self, object_dir):
+        """Lock of an object, held while retrieving it so that subscriptions
+        sharing it download it once and link it from the store."""
+        with ObjectStore._locks_guard:
+            return ObjectStore._locks.setdefault(object_dir, threading.Lock())
+
+    @staticmethod
+    def format_key(options):
+        spec = json.dumps([options.get("format"), options.get("postprocessors")], sort_keys=True, default=str)
+        return hashlib.sha1(spec.encode()).hexdigest()[:12]
+
+    def object_dir(self, extractor, video_id, format_key):
+        return os.path.join(self.root, _safe_name(extractor), _safe_name(video_id), format_key)
+
+    def media(self, object_dir):
+        if not os.path.isdir(object_dir):
+            return None
+        return find_media(self.object_basename, os.listdir(object_dir))
+
+    def checkout(self, object_dir, basename_path):
+        """Link the files of a complete object as basename_path.<suffix>.
+
+        Returns the linked paths, or an empty list when the object is missing.
+        """
+        if self.media(object_dir) is None:
+            return []
+        os.makedirs(os.path.dirname(basename_path), exist_ok=True)
+        linked = []
+        for name in sorted(os.listdir(object_dir)):
+            dst = basename_path + name[len(self.object_basename):]
+            if os.path.exists(dst):
+                os.remove(dst)
+            try:
+                os.link(os.path.join(object_dir, name), dst)
+            except OSError:
+                shutil.copy2(os.path.join(object_dir, name), dst)
+            linked.append(dst)
+        return linked
+
+    def checkin(self, object_dir, basename_path, exclude=("meta", "part", "ytdl")):
+        """Link the files of a downloaded episode into its object, the media
+        file last so that an object with media is always complete."""
+        directory, basename = os.path.split(basename_path)
+        names = [
+            name for name in os.listdir(directory)
+            if name.startswith(basename + ".") and name.rsplit(".", 1)[-1] not in exclude
+        ]
+        media = find_media(basename, names)
+        if media is None:
+            return False
+        os.makedirs(object_dir, exist_ok=True)
+        for name in sorted(names, key=lambda n: n == media):
+            dst = os.path.join(object_dir, self.object_basename + name[len(basename):])
+            if os.path.exists(dst):
+                continue
+            try:
+                os.link(os.path.join(directory, name), dst)
+            except OSError as e:
+                if e.errno == errno.EEXIST:
+                    # Checked in by another subscription meanwhile
+                    continue
+                if e.errno in unshareable_errors:
+                    # Not on the same filesystem, the object can not be shared
+                    shutil.rmtree(object_dir, ignore_errors=True)
+                return False
+        return True
+
+    def release(self, object_dir):
+        """Free the files of an object no subscription links to anymore."""
+        if not os.path.isdir(object_dir):
+            return False
+        names = os.listdir(object_dir)
+        if any(os.stat(os.path.join(object_dir, name)).st_nlink > 1 for name in names):
+            return False
+        shutil.rmtree(object_dir, ignore_errors=True)
+        parent = os.path.dirname(object_dir)
+        while parent != self.root and parent.startswith(self.root):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+        return True
@@ -2,7 +2,7 @@ FEED_TMPL = """<?xml version="1.0"?>
 {% if style_rss_feed %}
 <?xml-stylesheet type="text/xsl" href="style.xsl"?>
 {% endif %}
-<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">
+<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd" xmlns:atom="http://www.w3.org/2005/Atom">
   <channel>
     <updated>{{ last_update }}</updated>
     <title><![CDATA[{{ channel_title }}]]></title>
@@ -14,6 +14,9 @@ FEED_TMPL = """<?xml version="1.0"?>
     {% if icon_url %}
     <itunes:image href="{{ icon_url }}"/>
     {% endif %}
+    {% for link in feed_links %}
+    <atom:link rel="{{ link.rel }}" href="{{ link.href }}"/>
+    {% endfor %}
 
 
 {% for item in items %}
@@ -0,0 +1,98 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from .state import sized_image_re
+from .output import inherit_output
+
+# Thumbnail sources, in order of preference
+image_extensions = ["jpg", "jpeg", "png", "webp"]
+
+
+def sized_name(basename, size):
+    return "%s.%dx%d.jpg" % (basename, size, size)
+
+
+def resize_square(im, size):
+    """Center crop im to a square and scale it to size x size, reducing it by
+    an integer factor first when it is much larger."""
+    width, height = im.size
+    side = min(width, height)
+    box = ((width - side) // 2, (height - side) // 2, (width + side) // 2, (height + side) // 2)
+    factor = side // size
+    if factor >= 2:
+        im = im.reduce(factor, box=box)
+        box = None
+    return im.resize((size, size), Image.LANCZOS, box=box)
+
+
+def convert_image(src, dst, size=None, quality=None):
+    """Write src as a jpg at dst, resized to size x size when size is set.
+
+    The file is written under a temporary name and renamed, and gets the mtime
+    of src, which is what tells whether it is up to date.
+    """
+    stat = os.stat(src)
+    with Image.open(src) as im:
+        if size is not None:
+            # Let the JPEG decoder skip the resolution we do not need
+            im.draft("RGB", (size, size))
+        im = im.convert("RGB")
+        if size is not None:
+            im = resize_square(im, size)
+        directory, name = os.path.split(dst)
+        tmp_path = os.path.join(directory, ".%s.tmp" % name)
+        options = {} if quality is None else {"quality": int(quality)}
+        im.save(tmp_path, "JPEG", **options)
+    os.replace(tmp_path, dst)
+    os.utime(dst, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return dst
+
+
+def plan_thumbnails(snapshot, sizes=()):
+    """Conversions needed in a snapshot, as (source, target, size): the jpg of
+    thumbnails in other formats, and the resized copies missing or older than
+    their source."""
+    jobs = []
+    for basename, names in snapshot.groups.items():
+        images = [
+            n for n in names
+            if n.rsplit(".", 1)[-1] in image_extensions and not sized_image_re.search(n) and not n.startswith(".")
+        ]
+        if not images:
+            continue
+        src = min(images, key=lambda n: image_extensions.index(n.rsplit(".", 1)[-1]))
+        if src.rsplit(".", 1)[-1] not in ("jpg", "jpeg") and not snapshot.isfile(basename + ".jpg"):
+            jobs.append((src, basename + ".jpg", None))
+        for size in sizes:
+            dst = sized_name(basename, int(size))
+            if not snapshot.isfile(dst) or snapshot.stat(dst).st_mtime_ns != snapshot.stat(src).st_mtime_ns:
+                jobs.append((src, dst, int(size)))
+    return jobs
+
+
+def write_thumbnails(snapshot, sizes=(), quality=None, workers=None):
+    """Run the thumbnail conversions of a snapshot in a thread pool (Pillow
+    releases the GIL while decoding and encoding) and add the results to it.
+
+    Returns the names of the files written.
+    """
+    jobs = plan_thumbnails(snapshot, sizes)
+    if not jobs:
+        return []
+
+    def _convert(job):
+        src, dst, size = job
+        try:
+            convert_image(snapshot.path(src), snapshot.path(dst), size, quality)
+            return dst
+        except Exception as e:
+            print("Error converting thumbnail %s: %s" % (src, e))
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        written = [dst for dst in executor.map(inherit_output(_convert), jobs) if dst is not None]
+    for dst in written:
+        snapshot.add(dst)
+    return written
@@ -1,5 +1,6 @@
 import json
 import os
+import stat
 import types
 
 import pytest
@@ -86,3 +87,129 @@ def base_config(tmp_path):
         "url_root": "http://localhost:8080",
         "subscriptions": [],
     }
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    """ffmpeg stand-in writing its arguments to its output file."""
+    path = tmp_path / "ffmpeg"
+    path.write_text('#!/bin/sh\nfor a; do last="$a"; done\necho "$@" > "$last"\n')
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.fixture
+def fake_ydl_mod(tmp_path):
+    """youtube-dl like module serving a flat playlist of `count` videos."""
+
+    def _factory(count=3, fail_ids=(), delay=0):
+        import threading
+        import time
+
+        mod = types.SimpleNamespace()
+        mod.active = 0
+        mod.max_active = 0
+        mod.downloads = []
+        mod.probes = []
+        mod.instances = 0
+        mod.listings = 0
+        lock = threading.Lock()
+
+        class YoutubeDLError(Exception):
+            pass
+
+        def _entry(vid, options):
+            filename = options["outtmpl"] % {
+                "title": "Video %s" % vid,
+                "id": vid,
+                "upload_date": "20250101",
+                "ext": "mp4",
+            }
+            return {
+                "id": vid,
+                "title": "Video %s" % vid,
+                "upload_date": "20250101",
+                "ext": "mp4",
+                "format": "mp4",
+                "webpage_url": "https://example.com/watch?v=%s" % vid,
+                "_filename": filename,
+            }
+
+        class FakeYDL:
+            def __init__(self, options):
+                self.params = self.options = dict(options)
+                self._out_files = types.SimpleNamespace(out=None, error=None)
+                mod.instances += 1
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def _match_entry(self, info, incomplete=False):
+                return None
+
+            def prepare_filename(self, info):
+                return info["_filename"]
+
+            def extract_info(self, url, download=True, process=True, ie_key=None):
+                with lock:
+                    mod.active += 1
+                    mod.max_active = max(mod.max_active, mod.active)
+                try:
+                    time.sleep(delay)
+                    if not process and "watch?v=" in url:
+                        vid = url.split("=")[-1]
+                        mod.probes.append(vid)
+                        return {k: v for k, v in _entry(vid, self.options).items() if k != "_filename"}
+                    if not process:
+                        mod.listings += 1
+                        mod.pages_served = 0
+
+                        def _entries():
+                            for i in range(count):
+                                mod.pages_served = i + 1
+                                yield {"_type": "url", "id": "v%d" % i, "title": "Video v%d" % i, "url": "https://example.com/watch?v=v%d" % i, "ie_key": "Youtube"}
+
+                        return {
+                            "_type": "playlist",
+                            "extractor": "youtube:tab",
+                            "entries": _entries(),
+                        }
+                    vid = url.split("=")[-1]
+                    mod.probes.append(vid)
+                    return _entry(vid, self.options)
+                finally:
+                    with lock:
+                        mod.active -= 1
+
+            def process_ie_result(self, info, download=True):
+                return _entry(info["id"], self.options)
+
+            def download(self, urls):
+                url = urls[0]
+                with lock:
+                    mod.active += 1
+                    mod.max_active = max(mod.max_active, mod.active)
+                try:
+                    time.sleep(delay)
+                    vid = url.split("=")[-1]
+                    if vid in fail_ids:
+                        raise YoutubeDLError("download failed")
+                    mod.downloads.append(vid)
+                    entry = _entry(vid, self.options)
+                    os.makedirs(os.path.dirname(entry["_filename"]), exist_ok=True)
+                    with open(entry["_filename"], "w") as f:
+                        f.write("media")
+                    with open(entry["_filename"][:-4] + ".info.json", "w") as f:
+                        json.dump(entry, f)
+                finally:
+                    with lock:
+                        mod.active -= 1
+
+        mod.YoutubeDL = FakeYDL
+        mod.utils = types.SimpleNamespace(YoutubeDLError=YoutubeDLError)
+        return mod
+
+    return _factory
@@ -0,0 +1,85 @@
+import gzip
+import os
+
+import pytest
+
+from ydl_podcast import write_index, write_style, write_xml
+from ydl_podcast import compress
+from ydl_podcast.compress import compress_formats, write_compressed
+
+
+def test_compress_formats(monkeypatch):
+    assert compress_formats({}) == []
+    assert compress_formats({"precompress": ["gz"]}) == ["gz"]
+    monkeypatch.setattr(compress, "brotli", None)
+    assert compress_formats({"precompress": True}) == ["gz"]
+
+
+def test_write_compressed(tmp_path):
+    path = str(tmp_path / "feed.xml")
+    with open(path, "w") as f:
+        f.write("<rss/>" * 1000)
+    assert write_compressed(path, ["gz"]) == [path + ".gz"]
+    with gzip.open(path + ".gz") as f:
+        assert f.read() == b"<rss/>" * 1000
+    # Deterministic output
+    with open(path + ".gz", "rb") as f:
+        first = f.read()
+    write_compressed(path, ["gz"])
+    with open(path + ".gz", "rb") as f:
+        assert f.read() == first
+    assert write_compressed(path, ["gz"], changed=False) == []
+    write_compressed(path, [])
+    assert not os.path.exists(path + ".gz")
+
+
+def test_brotli(tmp_path):
+    brotli = pytest.importorskip("brotli")
+    path = str(tmp_path / "feed.xml")
+    with open(path, "w") as f:
+        f.write("<rss/>")
+    write_compressed(path, ["br"])
+    with open(path + ".br", "rb") as f:
+        assert brotli.decompress(f.read()) == b"<rss/>"
+
+
+def test_feed_siblings_follow_feed(tmp_path, make_info_json, base_sub, base_config):
+    make_info_json()
+    sub = {**base_sub, "precompress": ["gz"]}
+    feed = str(tmp_path / "testsub.xml")
+    write_xml(base_config, sub)
+    with gzip.open(feed + ".gz") as f, open(feed, "rb") as g:
+        assert f.read() == g.read()
+
+    mtime = os.stat(feed + ".gz").st_mtime_ns
+    write_xml(base_config, sub)
+    assert os.stat(feed + ".gz").st_mtime_ns == mtime
+
+    make_info_json(overrides={"id": "def456"}, basename="Other [def456][20250101]")
+    write_xml(base_config, sub)
+    with gzip.open(feed + ".gz") as f:
+        assert b"def456" in f.read()
+
+
+def test_removed_page_siblings(tmp_path, make_info_json, base_sub, base_config):
+    for day in [1, 2, 3]:
+        make_info_json(overrides={"id": "e%d" % day, "upload_date": "2025010%d" % day}, basename="E [e%d]" % day)
+    sub = {**base_sub, "precompress": ["gz"], "feed_max_items": 2}
+    write_xml(base_config, sub)
+    page = str(tmp_path / "testsub-page-1.xml")
+    assert os.path.isfile(page + ".gz")
+    sub["feed_max_items"] = None
+    write_xml(base_config, sub)
+    assert not os.path.exists(page + ".gz")
+
+
+def test_style_and_index(tmp_path, base_config):
+    base_config.update({"precompress": ["gz"], "index_enabled": True})
+    write_style(base_config)
+    write_index(base_config)
+    for name in ["style.xsl", "index.html"]:
+        with gzip.open(str(tmp_path / (name + ".gz"))) as f, open(str(tmp_path / name), "rb") as g:
+            assert f.read() == g.read()
+    mtime = os.stat(str(tmp_path / "style.xsl")).st_mtime_ns
+    write_style(base_config)
+    assert os.stat(str(tmp_path / "style.xsl")).st_mtime_ns == mtime
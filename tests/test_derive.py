@@ -0,0 +1,91 @@
+import json
+import os
+from unittest.mock import patch
+
+import ydl_podcast
+from ydl_podcast import derivation_stages, prepare_sub, run_subscriptions, episode_index, failure_queue
+
+
+def _config(base_config, ffmpeg, **derived):
+    base_config["subscriptions"] = [
+        {"name": "video", "url": "https://example.com/channel"},
+        {"name": "audio", "derive_from": "video", "audio_only": True, "format": "mp3",
+         "ydl_options": {"ffmpeg_location": ffmpeg}, **derived},
+    ]
+    return base_config
+
+
+def _subs(config):
+    return [prepare_sub(config, sub) for sub in config["subscriptions"]]
+
+
+def test_derived_sub_needs_no_url(base_config):
+    sub = prepare_sub(base_config, {"name": "audio", "derive_from": "video"})
+    assert sub is not None
+
+
+def test_derivation_stages(base_config):
+    subs = [{"name": "a", "derive_from": "b"}, {"name": "b"}, {"name": "c", "derive_from": "a"}, {"name": "d", "derive_from": "x"}]
+    assert [[s["name"] for s in stage] for stage in derivation_stages(subs)] == [["b", "d"], ["a"], ["c"]]
+
+
+def test_derivation_cycle(base_config):
+    subs = [{"name": "a", "derive_from": "b"}, {"name": "b", "derive_from": "a"}]
+    assert [[s["name"] for s in stage] for stage in derivation_stages(subs)] == [["a", "b"]]
+
+
+def test_derive_without_network(tmp_path, base_config, fake_ydl_mod, fake_ffmpeg):
+    mod = fake_ydl_mod(count=2)
+    config = _config(base_config, fake_ffmpeg)
+    # Derived subscription listed first still runs after its source
+    results = run_subscriptions(mod, config, list(reversed(_subs(config))))
+    assert [r["name"] for r in results] == ["audio", "video"]
+    assert [r["downloaded"] for r in results] == [2, 2]
+    assert sorted(mod.downloads) == ["v0", "v1"]
+
+    audio = tmp_path / "audio"
+    assert "libmp3lame" in (audio / "Video v0 [v0][20250101].mp3").read_text()
+    with open(str(audio / "Video v0 [v0][20250101].meta")) as f:
+        meta = json.load(f)
+    assert meta["ext"] == "mp3"
+    assert meta["subscription_name"] == "audio"
+    assert episode_index(_subs(config)[1]).get("v1")["media"] == "Video v1 [v1][20250101].mp3"
+    assert os.path.isfile(str(tmp_path / "audio.xml"))
+    assert "/audio/Video%20v1%20%5Bv1%5D%5B20250101%5D.mp3" in (tmp_path / "audio.xml").read_text()
+
+    # Nothing left to derive on the next run
+    results = run_subscriptions(mod, config, _subs(config))
+    assert [r["downloaded"] for r in results] == [0, 0]
+
+
+def test_derive_hardlinks_matching_format(tmp_path, base_config, fake_ydl_mod, fake_ffmpeg):
+    mod = fake_ydl_mod(count=1)
+    config = _config(base_config, fake_ffmpeg, audio_only=False, format="mp4")
+    run_subscriptions(mod, config, _subs(config))
+    name = "Video v0 [v0][20250101].mp4"
+    assert os.path.samefile(str(tmp_path / "audio" / name), str(tmp_path / "video" / name))
+
+
+def test_derive_failure_recorded(tmp_path, base_config, fake_ydl_mod):
+    mod = fake_ydl_mod(count=1)
+    config = _config(base_config, "false")
+    results = run_subscriptions(mod, config, _subs(config))
+    assert results[1]["downloaded"] == 0
+    assert failure_queue(_subs(config)[1]).get("v0")["attempts"] == 1
+
+
+def test_derive_applies_download_last(tmp_path, base_config, fake_ydl_mod, fake_ffmpeg):
+    mod = fake_ydl_mod(count=3)
+    config = _config(base_config, fake_ffmpeg, download_last=1)
+    results = run_subscriptions(mod, config, _subs(config))
+    assert results[1]["downloaded"] == 1
+
+
+def test_derive_skips_parsing_derived_episodes(tmp_path, base_config, fake_ydl_mod, fake_ffmpeg):
+    mod = fake_ydl_mod(count=3)
+    config = _config(base_config, fake_ffmpeg, download_last=2)
+    run_subscriptions(mod, config, _subs(config))
+    with patch("ydl_podcast._episode_metadata", wraps=ydl_podcast._episode_metadata) as parse:
+        results = run_subscriptions(mod, config, _subs(config))
+    assert results[1]["downloaded"] == 0
+    assert parse.call_count == 0
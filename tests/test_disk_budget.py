@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from ydl_podcast import disk_usage_index, enforce_disk_budget, episode_index, prepare_sub
+from ydl_podcast.retention import plan_eviction
+
+
+def _candidate(sub, size, age, atime=0):
+    return {"sub": sub, "size": size, "age": age, "atime": atime, "episodes": []}
+
+
+def test_plan_under_budget():
+    assert plan_eviction([_candidate("a", 10, 1)], 10) == []
+
+
+def test_plan_oldest():
+    candidates = [_candidate("a", 10, 3), _candidate("b", 10, 1), _candidate("a", 10, 2)]
+    assert [c["age"] for c in plan_eviction(candidates, 15)] == [1, 2]
+
+
+def test_plan_lru():
+    candidates = [_candidate("a", 10, 1, atime=5), _candidate("b", 10, 2, atime=3)]
+    assert [c["age"] for c in plan_eviction(candidates, 10, "lru")] == [2]
+
+
+def test_plan_weighted():
+    candidates = [_candidate("a", 10, i) for i in range(4)] + [_candidate("b", 10, 10 + i) for i in range(2)]
+    evicted = plan_eviction(candidates, 40, "weighted", {"a": 1, "b": 1})
+    assert [(c["sub"], c["age"]) for c in evicted] == [("a", 0), ("a", 1)]
+    evicted = plan_eviction(candidates, 40, "weighted", {"a": 4, "b": 1})
+    assert [(c["sub"], c["age"]) for c in evicted] == [("b", 10), ("a", 0)]
+
+
+def test_plan_unknown_policy():
+    with pytest.raises(ValueError):
+        plan_eviction([_candidate("a", 10, 1)], 5, "random")
+
+
+def _download(tmp_path, name, episodes):
+    d = tmp_path / name
+    d.mkdir()
+    for basename, upload_date, size in episodes:
+        (d / (basename + ".mp4")).write_text("x" * size)
+        (d / (basename + ".meta")).write_text('{"id": "%s", "upload_date": "%s"}' % (basename, upload_date))
+        (d / (basename + ".info.json")).write_text('{"id": "%s", "title": "%s", "upload_date": "%s", "ext": "mp4", "format": "mp4"}' % (basename, basename, upload_date))
+    (d / "icon.jpg").write_text("icon")
+
+
+def test_enforce_evicts_across_subscriptions(tmp_path, base_config, capsys):
+    _download(tmp_path, "a", [("a1", "20250101", 100), ("a2", "20250301", 100)])
+    _download(tmp_path, "b", [("b1", "20250201", 100), ("b2", "20250401", 100)])
+    base_config["subscriptions"] = [{"name": "a", "url": "https://a"}, {"name": "b", "url": "https://b"}]
+    base_config["disk_budget"] = 250
+    subs = [prepare_sub(base_config, s) for s in base_config["subscriptions"]]
+    assert sum(c["size"] for c in disk_usage_index(subs)) == 400
+
+    deleted = enforce_disk_budget(base_config)
+    assert sorted(os.path.basename(p) for p in deleted) == [
+        "a1.info.json", "a1.meta", "a1.mp4", "b1.info.json", "b1.meta", "b1.mp4",
+    ]
+    assert sorted(os.listdir(str(tmp_path / "a"))) == ["a2.info.json", "a2.meta", "a2.mp4", "icon.jpg"]
+    assert episode_index(subs[0]).get("a1")["retired"]
+    assert "a1" not in (tmp_path / "a.xml").read_text()
+    assert "a2" in (tmp_path / "a.xml").read_text()
+    assert "evicted 2 episode(s), 200 bytes freed" in capsys.readouterr().out
+
+
+def test_enforce_without_budget(base_config):
+    assert enforce_disk_budget(base_config) == []
+
+
+def test_evicted_episodes_not_downloaded_again(tmp_path, base_config, fake_ydl_mod):
+    from ydl_podcast import download
+
+    mod = fake_ydl_mod(count=3)
+    base_config["subscriptions"] = [{"name": "testsub", "url": "https://example.com/channel", "quiet": True}]
+    base_config["disk_budget"] = 5
+    sub = prepare_sub(base_config, base_config["subscriptions"][0])
+    d = tmp_path / "testsub"
+    d.mkdir()
+    download(mod, sub)
+    for name in os.listdir(str(d)):
+        if name.endswith(".mp4"):
+            (d / (name[: -len(".mp4")] + ".en.vtt")).write_text("subtitles")
+    enforce_disk_budget(base_config)
+    kept = sorted(n for n in os.listdir(str(d)) if n.endswith(".mp4") or n.endswith(".vtt"))
+    assert len(kept) == 2 and kept[0] == kept[1][: -len(".mp4")] + ".en.vtt"
+    mod.downloads.clear()
+    assert download(mod, sub) == []
+    assert mod.downloads == []
+
+
+def test_linked_episodes_counted_once(tmp_path, base_config, capsys):
+    _download(tmp_path, "video", [("v1", "20250101", 1000), ("v2", "20250201", 1000)])
+    _download(tmp_path, "audio", [])
+    for name in os.listdir(str(tmp_path / "video")):
+        if name != "icon.jpg":
+            os.link(str(tmp_path / "video" / name), str(tmp_path / "audio" / name))
+    base_config["subscriptions"] = [
+        {"name": "video", "url": "https://a"},
+        {"name": "audio", "derive_from": "video"},
+    ]
+    subs = [prepare_sub(base_config, s) for s in base_config["subscriptions"]]
+    assert sum(c["size"] for c in disk_usage_index(subs)) == 2000
+
+    base_config["disk_budget"] = 2500
+    assert enforce_disk_budget(base_config) == []
+
+    base_config["disk_budget"] = 1500
+    deleted = enforce_disk_budget(base_config)
+    assert sorted(os.path.basename(p) for p in deleted if p.endswith(".mp4")) == ["v1.mp4", "v1.mp4"]
+    assert "evicted 1 episode(s), 1000 bytes freed" in capsys.readouterr().out
@@ -53,3 +53,39 @@ def test_failure_not_quiet_prints(capsys):
     mod = _make_ydl_mod(should_fail=True)
     _download_with_ydl(mod, {}, "http://example.com", quiet=False)
     assert "download failed" in capsys.readouterr().out
+
+
+def test_download_sequential(fake_ydl_mod, base_sub):
+    from ydl_podcast import download
+
+    mod = fake_ydl_mod(count=3)
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    downloaded = download(mod, base_sub)
+    assert sorted(e["id"] for e in downloaded) == ["v0", "v1", "v2"]
+    assert mod.max_active == 1
+
+
+def test_download_concurrent_host_cap(fake_ydl_mod, base_sub):
+    from ydl_podcast import download
+
+    mod = fake_ydl_mod(count=6, delay=0.02)
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    base_sub["episode_concurrency"] = 4
+    base_sub["host_concurrency"] = 2
+    downloaded = download(mod, base_sub)
+    assert len(downloaded) == 6
+    assert mod.max_active == 2
+
+
+def test_download_concurrent_meta_only_on_success(fake_ydl_mod, base_sub):
+    from ydl_podcast import download
+
+    mod = fake_ydl_mod(count=3, fail_ids=("v1",))
+    d = os.path.join(base_sub["output_dir"], base_sub["name"])
+    os.makedirs(d)
+    base_sub["episode_concurrency"] = 3
+    downloaded = download(mod, base_sub)
+    assert sorted(e["id"] for e in downloaded) == ["v0", "v2"]
+    metas = sorted(f for f in os.listdir(d) if f.endswith(".meta"))
+    assert len(metas) == 2
+    assert not any("[v1]" in f for f in metas)
@@ -0,0 +1,74 @@
+import json
+import os
+
+from ydl_podcast import episode_index, download
+from ydl_podcast.state import EpisodeIndex
+
+
+def _episode(d, basename, video_id, ext="mp4", meta=True):
+    (d / ("%s.%s" % (basename, ext))).write_bytes(b"media")
+    (d / ("%s.info.json" % basename)).write_text(json.dumps({"id": video_id}))
+    if meta:
+        (d / ("%s.meta" % basename)).write_text(json.dumps({"id": video_id}))
+
+
+def test_rebuild_from_directory(tmp_path, base_sub):
+    d = tmp_path / "testsub"
+    d.mkdir()
+    _episode(d, "First [a1][20250101]", "a1")
+    _episode(d, "Second [b2][20250102]", "b2", ext="mp3")
+    _episode(d, "Partial [c3][20250103]", "c3", meta=False)
+    index = episode_index(base_sub)
+    assert len(index) == 2
+    assert index.get("a1")["media"] == "First [a1][20250101].mp4"
+    assert index.get("b2")["size"] == 5
+    assert "c3" not in index
+
+
+def test_rebuild_empty_meta_uses_filename(tmp_path, base_sub):
+    d = tmp_path / "testsub"
+    d.mkdir()
+    (d / "Title [xyz][20250101].mp4").write_bytes(b"")
+    (d / "Title [xyz][20250101].meta").write_text("")
+    assert episode_index(base_sub).get("xyz")["basename"] == "Title [xyz][20250101]"
+
+
+def test_log_persists_and_compacts(tmp_path):
+    path = str(tmp_path / "state" / "episodes.jsonl")
+    index = EpisodeIndex(path, str(tmp_path / "missing"))
+    for i in range(150):
+        index.record("v", "b%d" % i, "b%d.mp4" % i)
+    index.record("w", "w", "w.mp4")
+    index.remove("w")
+    with open(path) as f:
+        assert len(f.readlines()) < 150
+    reloaded = EpisodeIndex(path, str(tmp_path / "missing"))
+    assert reloaded.get("v")["basename"] == "b149"
+    assert "w" not in reloaded
+
+
+def test_download_skips_indexed(fake_ydl_mod, base_sub):
+    mod = fake_ydl_mod(count=2)
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    assert len(download(mod, base_sub)) == 2
+    assert episode_index(base_sub).get("v0")["meta"] is True
+
+    mod = fake_ydl_mod(count=2)
+    assert download(mod, base_sub) == []
+    assert mod.probes == []
+
+
+def test_retire_keeps_tombstone(tmp_path):
+    d = tmp_path / "sub"
+    d.mkdir()
+    path = str(tmp_path / "state" / "index.jsonl")
+    index = EpisodeIndex(path, str(d))
+    index.record("x", "ep [x]", "ep [x].mp4", size=10, upload_date="20250101")
+    index.retire_basename("ep [x]")
+    assert index.get("x") == {
+        "id": "x", "basename": "ep [x]", "media": None, "meta": False, "size": None,
+        "retired": True, "upload_date": "20250101",
+    }
+    assert "x" in index
+    assert EpisodeIndex(path, str(d)).get("x")["retired"]
+    assert index.rebuild().get("x")["retired"]
@@ -0,0 +1,178 @@
+import itertools
+import os
+import types
+
+from ydl_podcast import extract_entry, parse_playlist_items, stream_metadata
+
+
+def test_stream_yields_metadata_then_entries(fake_ydl_mod, base_sub):
+    mod = fake_ydl_mod(count=3)
+    stream = stream_metadata(mod, "https://example.com/channel", {"outtmpl": "%(id)s.%(ext)s"})
+    metadata = next(stream)
+    assert metadata["_type"] == "playlist"
+    assert "entries" not in metadata
+    assert [e["id"] for e in stream] == ["v0", "v1", "v2"]
+
+
+def test_stream_is_lazy(fake_ydl_mod):
+    mod = fake_ydl_mod(count=100)
+    stream = stream_metadata(mod, "https://example.com/channel", {})
+    next(stream)
+    assert len(list(itertools.islice(stream, 2))) == 2
+    stream.close()
+    assert mod.pages_served == 2
+
+
+def test_stream_reverse(fake_ydl_mod):
+    mod = fake_ydl_mod(count=3)
+    stream = stream_metadata(mod, "https://example.com/channel", {"playlistreverse": True})
+    next(stream)
+    assert [e["id"] for e in stream] == ["v2", "v1", "v0"]
+
+
+def test_stream_error_yields_none(fake_ydl_mod):
+    mod = fake_ydl_mod()
+
+    class ErrorYDL(mod.YoutubeDL):
+        def extract_info(self, *args, **kwargs):
+            raise mod.utils.YoutubeDLError("fail")
+
+    mod.YoutubeDL = ErrorYDL
+    assert list(stream_metadata(mod, "https://example.com/channel", {})) == [None]
+
+
+def test_extract_entry(fake_ydl_mod, tmp_path):
+    mod = fake_ydl_mod()
+    info, reason = extract_entry(mod, "https://example.com/watch?v=v1", {"outtmpl": str(tmp_path / "%(id)s.%(ext)s")})
+    assert reason is None
+    assert info["_filename"] == str(tmp_path / "v1.mp4")
+
+
+def test_extract_entry_rejected(fake_ydl_mod):
+    mod = fake_ydl_mod()
+
+    class RejectingYDL(mod.YoutubeDL):
+        def _match_entry(self, info, incomplete=False):
+            return "upload date is not in range"
+
+    mod.YoutubeDL = RejectingYDL
+    info, reason = extract_entry(mod, "https://example.com/watch?v=v1", {"outtmpl": "%(id)s.%(ext)s"})
+    assert info is None
+    assert reason == "upload date is not in range"
+
+
+def test_extract_entry_error_reason(fake_ydl_mod):
+    mod = fake_ydl_mod()
+
+    class ErrorYDL(mod.YoutubeDL):
+        def extract_info(self, *args, **kwargs):
+            raise mod.utils.YoutubeDLError("Video unavailable")
+
+    mod.YoutubeDL = ErrorYDL
+    assert extract_entry(mod, "https://example.com/watch?v=v1", {}) == (None, "Video unavailable")
+
+
+def _library(base_sub, ids):
+    from ydl_podcast import episode_index
+
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    index = episode_index(base_sub)
+    for vid in ids:
+        open(os.path.join(base_sub["output_dir"], base_sub["name"], "%s.mp4" % vid), "w").close()
+        index.record(vid, vid, "%s.mp4" % vid)
+
+
+def test_incremental_discovery_stops_at_known(fake_ydl_mod, base_sub):
+    from ydl_podcast import download
+
+    _library(base_sub, ["v2", "v3", "v4"])
+    base_sub["incremental_discovery"] = 2
+    mod = fake_ydl_mod(count=50)
+    download(mod, base_sub)
+    assert mod.pages_served == 4
+    assert sorted(mod.probes) == ["v0", "v1"]
+
+
+def test_incremental_discovery_full_scan_every(fake_ydl_mod, base_sub):
+    from ydl_podcast import download
+
+    _library(base_sub, ["v0", "v1"])
+    base_sub["incremental_discovery"] = 1
+    base_sub["full_scan_every"] = 2
+    mod = fake_ydl_mod(count=10)
+    download(mod, base_sub)
+    assert mod.pages_served == 1
+    mod = fake_ydl_mod(count=10)
+    download(mod, base_sub)
+    assert mod.pages_served == 10
+
+
+class _PagedList:
+    """youtube_dl OnDemandPagedList stand-in: no __iter__ nor __getitem__."""
+
+    _pagesize = 2
+
+    def __init__(self, count):
+        self.count = count
+        self.slices = []
+
+    def getslice(self, start=0, end=None):
+        self.slices.append((start, end))
+        return [
+            {"_type": "url", "id": "v%d" % i, "url": "https://example.com/watch?v=v%d" % i}
+            for i in range(start, min(end, self.count))
+        ]
+
+
+def test_stream_pages_through_paged_list(fake_ydl_mod):
+    mod = fake_ydl_mod()
+    paged = _PagedList(5)
+
+    class PagedYDL(mod.YoutubeDL):
+        def extract_info(self, url, download=True, process=True, ie_key=None):
+            return {"_type": "playlist", "extractor": "youtube:tab", "entries": paged}
+
+    mod.YoutubeDL = PagedYDL
+    stream = stream_metadata(mod, "https://example.com/channel", {})
+    next(stream)
+    assert [e["id"] for e in itertools.islice(stream, 3)] == ["v0", "v1", "v2"]
+    assert paged.slices == [(0, 2), (2, 4)]
+    assert [e["id"] for e in stream] == ["v3", "v4"]
+    assert paged.slices[-1] == (4, 6)
+
+
+def test_parse_playlist_items():
+    assert parse_playlist_items("1-3,7,10-") == [(1, 3), (7, 7), (10, None)]
+    assert parse_playlist_items("-2, :2, bogus") == [(-2, -2), (1, 2)]
+
+
+def test_stream_applies_playlist_slicing(fake_ydl_mod):
+    mod = fake_ydl_mod(count=100)
+    stream = stream_metadata(mod, "https://example.com/channel", {"playliststart": 2, "playlistend": 4})
+    next(stream)
+    assert [e["id"] for e in stream] == ["v1", "v2", "v3"]
+    # Listing stops after the last selected entry
+    assert mod.pages_served == 5
+
+    stream = stream_metadata(mod, "https://example.com/channel", {"playlist_items": "1,3-4"})
+    next(stream)
+    assert [e["id"] for e in stream] == ["v0", "v2", "v3"]
+
+    mod = fake_ydl_mod(count=5)
+    stream = stream_metadata(mod, "https://example.com/channel", {"playlist_items": "-2-"})
+    next(stream)
+    assert [e["id"] for e in stream] == ["v3", "v4"]
+
+
+def test_stream_break_on_reject(fake_ydl_mod):
+    mod = fake_ydl_mod(count=100)
+
+    class RejectingYDL(mod.YoutubeDL):
+        def _match_entry(self, info, incomplete=False):
+            return "too old" if info["id"] == "v2" else None
+
+    mod.YoutubeDL = RejectingYDL
+    stream = stream_metadata(mod, "https://example.com/channel", {"break_on_reject": True})
+    next(stream)
+    assert [e["id"] for e in stream] == ["v0", "v1"]
+    assert mod.pages_served == 3
@@ -0,0 +1,94 @@
+import os
+
+from ydl_podcast import ExtractionCache, extract_entry, prepare_sub, run_subscriptions, stream_metadata
+
+
+def _sub(base_config, name, **extra):
+    return prepare_sub(base_config, {"name": name, "url": "https://example.com/channel", **extra})
+
+
+def test_playlist_listed_once(tmp_path, base_config, fake_ydl_mod):
+    mod = fake_ydl_mod(count=3)
+    cache = ExtractionCache(mod)
+    options = {"outtmpl": str(tmp_path / "%(id)s.%(ext)s")}
+    first = list(stream_metadata(mod, "https://example.com/channel", options, cache=cache))
+    second = list(stream_metadata(mod, "https://example.com/channel", dict(options, playlistreverse=True), cache=cache))
+    cache.close()
+    assert mod.listings == 1
+    assert [e["id"] for e in first[1:]] == ["v0", "v1", "v2"]
+    assert [e["id"] for e in second[1:]] == ["v2", "v1", "v0"]
+    assert cache.stats["playlist_hits"] == 1
+
+
+def test_shared_entries_pulled_lazily(tmp_path, fake_ydl_mod):
+    mod = fake_ydl_mod(count=5)
+    cache = ExtractionCache(mod)
+    options = {"outtmpl": str(tmp_path / "%(id)s.%(ext)s")}
+    stream = stream_metadata(mod, "https://example.com/channel", options, cache=cache)
+    next(stream)
+    next(stream)
+    stream.close()
+    assert mod.pages_served == 1
+    assert len(list(stream_metadata(mod, "https://example.com/channel", options, cache=cache))) == 6
+    cache.close()
+
+
+def test_entry_extracted_once_per_output(tmp_path, fake_ydl_mod):
+    mod = fake_ydl_mod()
+    cache = ExtractionCache(mod)
+    url = "https://example.com/watch?v=v0"
+    video, _ = extract_entry(mod, url, {"outtmpl": str(tmp_path / "video" / "%(id)s.%(ext)s")}, cache=cache)
+    audio, _ = extract_entry(
+        mod, url, {"outtmpl": str(tmp_path / "audio" / "%(id)s.%(ext)s"), "format": "bestaudio"}, cache=cache
+    )
+    assert mod.probes == ["v0"]
+    assert video["_filename"] != audio["_filename"]
+    assert cache.stats == {"playlist_hits": 0, "playlist_misses": 0, "entry_hits": 1, "entry_misses": 1}
+
+
+def test_entry_cache_keyed_by_extraction_options(tmp_path, fake_ydl_mod):
+    mod = fake_ydl_mod()
+    cache = ExtractionCache(mod)
+    url = "https://example.com/watch?v=v0"
+    outtmpl = str(tmp_path / "%(id)s.%(ext)s")
+    extract_entry(mod, url, {"outtmpl": outtmpl}, cache=cache)
+    extract_entry(mod, url, {"outtmpl": outtmpl, "cookiefile": "cookies.txt"}, cache=cache)
+    assert mod.probes == ["v0", "v0"]
+
+
+def test_entry_errors_cached(tmp_path, fake_ydl_mod):
+    mod = fake_ydl_mod()
+    cache = ExtractionCache(mod)
+    calls = []
+
+    class FailingYDL:
+        def extract_info(self, url, download=True, process=True):
+            calls.append(url)
+            raise mod.utils.YoutubeDLError("Private video")
+
+    for _ in range(2):
+        try:
+            cache.entry(FailingYDL(), "https://example.com/watch?v=v0", {})
+        except mod.utils.YoutubeDLError as e:
+            assert str(e) == "Private video"
+    assert len(calls) == 1
+
+
+def test_run_shares_extraction(tmp_path, base_config, fake_ydl_mod, capsys):
+    mod = fake_ydl_mod(count=2)
+    subs = [_sub(base_config, "video"), _sub(base_config, "audio", audio_only=True, format="mp3")]
+    results = run_subscriptions(mod, base_config, subs)
+    assert all(r["status"] == "ok" for r in results)
+    assert [r["downloaded"] for r in results] == [2, 2]
+    assert mod.listings == 1
+    assert sorted(mod.probes) == ["v0", "v1"]
+    assert os.path.isfile(str(tmp_path / "audio" / "Video v0 [v0][20250101].meta"))
+    assert "1 playlist(s) and 2 video(s) shared" in capsys.readouterr().out
+
+
+def test_run_sharing_disabled(tmp_path, base_config, fake_ydl_mod):
+    mod = fake_ydl_mod(count=2)
+    base_config["share_extraction"] = False
+    subs = [_sub(base_config, "video"), _sub(base_config, "audio", audio_only=True, format="mp3")]
+    run_subscriptions(mod, base_config, subs)
+    assert mod.listings == 2
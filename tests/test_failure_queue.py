@@ -0,0 +1,48 @@
+import os
+
+from ydl_podcast import download, failure_queue
+from ydl_podcast.state import FailureQueue
+
+
+def test_exponential_backoff_and_give_up(tmp_path):
+    queue = FailureQueue(str(tmp_path / "failures.json"))
+    first = queue.record("v", "geo blocked", 1000, 60, 3)
+    assert (first["attempts"], first["next_eligible"], first["gave_up"]) == (1, 1060, False)
+    second = queue.record("v", "geo blocked", 2000, 60, 3)
+    assert second["next_eligible"] == 2120
+    assert queue.record("v", "geo blocked", 3000, 60, 3)["gave_up"] is True
+
+
+def test_persisted_and_reset(tmp_path):
+    path = str(tmp_path / "failures.json")
+    queue = FailureQueue(path)
+    queue.record("a", "err", 0, 60, 3)
+    queue.record("b", "err", 0, 60, 3)
+    queue.save()
+    queue = FailureQueue(path)
+    assert sorted(queue.entries) == ["a", "b"]
+    assert queue.reset(["a"]) == ["a"]
+    queue.save()
+    assert list(FailureQueue(path).entries) == ["b"]
+
+
+def test_download_failure_recorded_and_skipped(fake_ydl_mod, base_sub):
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    mod = fake_ydl_mod(count=2, fail_ids=("v1",))
+    download(mod, base_sub)
+    failure = failure_queue(base_sub).get("v1")
+    assert failure["attempts"] == 1
+    assert failure["last_error"] == "download failed"
+
+    mod = fake_ydl_mod(count=2, fail_ids=("v1",))
+    download(mod, base_sub)
+    assert mod.probes == []
+
+
+def test_download_retry_after_backoff(fake_ydl_mod, base_sub):
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    base_sub["retry_backoff"] = 0
+    download(fake_ydl_mod(count=2, fail_ids=("v1",)), base_sub)
+    mod = fake_ydl_mod(count=2)
+    assert [e["id"] for e in download(mod, base_sub)] == ["v1"]
+    assert failure_queue(base_sub).get("v1") is None
@@ -0,0 +1,50 @@
+import json
+import os
+
+from ydl_podcast import write_feed_sidecar, write_sub_sidecars, parse_sub_metadata, metadata_parse, download
+
+
+def test_sidecar_fields(tmp_path, sample_metadata_dict):
+    full = {**sample_metadata_dict, "formats": [{"format_id": "1"}] * 100}
+    path = write_feed_sidecar(str(tmp_path / "video"), full)
+    with open(path) as f:
+        sidecar = json.load(f)
+    assert "formats" not in sidecar
+    assert sidecar["title"] == "Test Video"
+
+
+def test_metadata_parse_sidecar_matches_info_json(make_info_json, tmp_path):
+    info_path = make_info_json()
+    with open(info_path) as f:
+        write_feed_sidecar(info_path[: -len(".info.json")], json.load(f))
+    sidecar_path = info_path[: -len(".info.json")] + ".feed.json"
+    assert metadata_parse(sidecar_path) == metadata_parse(info_path)
+
+
+def test_sidecar_preferred(make_info_json, base_sub):
+    info_path = make_info_json()
+    with open(info_path) as f:
+        md = json.load(f)
+    md["title"] = "From sidecar"
+    write_feed_sidecar(info_path[: -len(".info.json")], md)
+    mds = parse_sub_metadata(base_sub)
+    assert list(mds) == ["Test Video [abc123][20250101].feed.json"]
+    assert mds["Test Video [abc123][20250101].feed.json"]["title"] == "From sidecar"
+
+
+def test_backfill(make_info_json, base_sub):
+    make_info_json()
+    assert len(write_sub_sidecars(base_sub)) == 1
+    assert write_sub_sidecars(base_sub) == []
+
+
+def test_written_with_meta(fake_ydl_mod, base_sub):
+    mod = fake_ydl_mod(count=1)
+    d = os.path.join(base_sub["output_dir"], base_sub["name"])
+    os.makedirs(d)
+    base_sub["slim_sidecar"] = True
+    download(mod, base_sub)
+    assert sorted(f for f in os.listdir(d) if f.endswith((".meta", ".feed.json"))) == [
+        "Video v0 [v0][20250101].feed.json",
+        "Video v0 [v0][20250101].meta",
+    ]
@@ -0,0 +1,49 @@
+import os
+
+from ydl_podcast import download
+from ydl_podcast.filters import compile_filters, apply_filters
+
+
+ENTRIES = [
+    {"id": "a", "title": "Weekly show #1", "duration": 3600},
+    {"id": "b", "title": "Weekly show #2 (trailer)", "duration": 60},
+    {"id": "c", "title": "Live stream", "duration": None, "live_status": "is_live"},
+    {"id": "d", "title": "Old episode", "duration": 3000, "upload_date": "20200101"},
+    {"id": "e", "title": None},
+]
+
+
+def _run(spec):
+    dropped = {}
+    kept = [e["id"] for e in apply_filters(ENTRIES, compile_filters(spec), dropped)]
+    return kept, dropped
+
+
+def test_no_filters():
+    assert _run(None) == (["a", "b", "c", "d", "e"], {})
+
+
+def test_title_and_exclude():
+    assert _run({"title": "weekly", "exclude_title": "trailer"}) == (["a", "e"], {"title": 2, "exclude_title": 1})
+
+
+def test_duration_bounds_keep_unknown():
+    assert _run({"min_duration": 120, "max_duration": 3200}) == (["c", "d", "e"], {"min_duration": 1, "max_duration": 1})
+
+
+def test_is_live():
+    assert _run({"is_live": False}) == (["a", "b", "d", "e"], {"is_live": 1})
+
+
+def test_upload_date():
+    assert _run({"after": "20240101"}) == (["a", "b", "c", "e"], {"after": 1})
+
+
+def test_download_filters_before_extraction(fake_ydl_mod, base_sub, capsys):
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    base_sub["filters"] = {"exclude_title": "v1$"}
+    mod = fake_ydl_mod(count=3)
+    for e in download(mod, base_sub):
+        assert e["id"] != "v1"
+    assert "v1" not in mod.probes
+    assert "1 by exclude_title" in capsys.readouterr().out
@@ -0,0 +1,57 @@
+import os
+import subprocess
+
+import pytest
+
+from ydl_podcast.media import plan_media, derive_media, link_or_copy
+
+
+def test_plan_video_same_format_links():
+    assert plan_media("a.mp4", False) == ("mp4", "link")
+    assert plan_media("a.mp4", False, "mp4") == ("mp4", "link")
+    assert plan_media("a.webm", False, "mkv") == ("mkv", "copy")
+
+
+def test_plan_audio_best_copies_stream():
+    assert plan_media("a.mp4", True, "best", acodec="mp4a.40.2", vcodec="avc1") == ("m4a", "copy")
+    assert plan_media("a.webm", True, None, acodec="opus", vcodec="vp9") == ("opus", "copy")
+    assert plan_media("a.m4a", True, "best", acodec="mp4a.40.2", vcodec="none") == ("m4a", "link")
+    assert plan_media("a.mkv", True, "best") == ("mp3", "encode")
+
+
+def test_plan_audio_codec():
+    assert plan_media("a.mp4", True, "mp3", acodec="mp4a.40.2", vcodec="avc1") == ("mp3", "encode")
+    assert plan_media("a.mp4", True, "m4a", acodec="mp4a.40.2", vcodec="avc1") == ("m4a", "copy")
+    assert plan_media("a.mp3", True, "mp3", acodec="mp3", vcodec="none") == ("mp3", "link")
+
+
+def test_link_or_copy_hardlinks(tmp_path):
+    src = tmp_path / "a.mp4"
+    src.write_text("media")
+    link_or_copy(str(src), str(tmp_path / "b.mp4"))
+    assert os.stat(str(src)).st_nlink == 2
+
+
+def test_derive_media_links(tmp_path):
+    src = tmp_path / "a.mp4"
+    src.write_text("media")
+    out = derive_media(str(src), str(tmp_path / "b"), False)
+    assert out == str(tmp_path / "b.mp4")
+    assert os.path.samefile(out, str(src))
+
+
+def test_derive_media_transcodes(tmp_path, fake_ffmpeg):
+    src = tmp_path / "a.mp4"
+    src.write_text("media")
+    out = derive_media(str(src), str(tmp_path / "b"), True, "mp3", ffmpeg=fake_ffmpeg)
+    assert out == str(tmp_path / "b.mp3")
+    assert "-c:a libmp3lame -q:a 5" in open(out).read()
+    assert not [n for n in os.listdir(str(tmp_path)) if ".tmp." in n]
+
+
+def test_derive_media_failure_cleans_up(tmp_path):
+    src = tmp_path / "a.mp4"
+    src.write_text("media")
+    with pytest.raises(subprocess.CalledProcessError):
+        derive_media(str(src), str(tmp_path / "b"), True, "mp3", ffmpeg="false")
+    assert sorted(os.listdir(str(tmp_path))) == ["a.mp4"]
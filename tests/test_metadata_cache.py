@@ -0,0 +1,49 @@
+import json
+import os
+from unittest.mock import patch
+
+import ydl_podcast
+from ydl_podcast import parse_sub_metadata, sub_snapshot, write_xml
+
+
+def test_second_run_uses_cache(make_info_json, base_sub):
+    make_info_json()
+    first = parse_sub_metadata(base_sub, sub_snapshot(base_sub))
+    with patch("ydl_podcast.metadata_parse") as parse:
+        second = parse_sub_metadata(base_sub, sub_snapshot(base_sub))
+    parse.assert_not_called()
+    assert first == second
+
+
+def test_changed_file_is_reparsed(make_info_json, base_sub):
+    path = make_info_json()
+    parse_sub_metadata(base_sub, sub_snapshot(base_sub))
+    with open(path) as f:
+        md = json.load(f)
+    md["title"] = "Renamed episode"
+    with open(path, "w") as f:
+        json.dump(md, f)
+    os.utime(path, ns=(1, 1))
+    mds = parse_sub_metadata(base_sub, sub_snapshot(base_sub))
+    assert list(mds.values())[0]["title"] == "Renamed episode"
+
+
+def test_removed_file_is_pruned(make_info_json, base_sub):
+    path = make_info_json()
+    parse_sub_metadata(base_sub, sub_snapshot(base_sub))
+    os.remove(path)
+    assert parse_sub_metadata(base_sub, sub_snapshot(base_sub)) == {}
+
+
+def test_feed_items_cached(make_info_json, base_sub, base_config):
+    make_info_json()
+    write_xml(base_config, base_sub)
+    with patch("ydl_podcast.feed_item") as item, patch("ydl_podcast.metadata_parse") as parse:
+        write_xml(base_config, base_sub)
+    item.assert_not_called()
+    parse.assert_not_called()
+
+    base_sub["url_root"] = "http://other"
+    with patch("ydl_podcast.feed_item", wraps=ydl_podcast.feed_item) as item:
+        write_xml(base_config, base_sub)
+    assert item.call_count == 1
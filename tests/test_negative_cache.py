@@ -0,0 +1,56 @@
+import os
+
+from ydl_podcast import download, negative_cache, negative_reason
+
+
+def _rejecting_mod(fake_ydl_mod, reasons):
+    mod = fake_ydl_mod(count=2)
+
+    class RejectingYDL(mod.YoutubeDL):
+        def extract_info(self, url, download=True, process=True, ie_key=None):
+            vid = url.split("=")[-1]
+            if process and vid in reasons:
+                mod.probes.append(vid)
+                raise mod.utils.YoutubeDLError(reasons[vid])
+            return super().extract_info(url, download=download, process=process, ie_key=ie_key)
+
+    mod.YoutubeDL = RejectingYDL
+    return mod
+
+
+def test_negative_reason():
+    assert negative_reason("[download] upload date is not in range 20250101 - 99991231") == "out of daterange"
+    assert negative_reason("Join this channel to get access to members-only content") == "members-only"
+    assert negative_reason("ERROR: [youtube] x: Video unavailable") == "unavailable"
+    assert negative_reason("HTTP Error 500") == "failed"
+
+
+def test_rejected_entries_not_extracted_again(fake_ydl_mod, base_sub):
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    mod = _rejecting_mod(fake_ydl_mod, {"v1": "Video unavailable"})
+    assert [e["id"] for e in download(mod, base_sub)] == ["v0"]
+    assert negative_cache(base_sub).entries["v1"]["reason"] == "unavailable"
+
+    mod = _rejecting_mod(fake_ydl_mod, {"v1": "Video unavailable"})
+    download(mod, base_sub)
+    assert mod.probes == []
+
+
+def test_expired_entries_extracted_again(fake_ydl_mod, base_sub):
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    base_sub["negative_cache_ttl"] = {"failed": 0}
+    mod = _rejecting_mod(fake_ydl_mod, {"v1": "HTTP Error 500"})
+    download(mod, base_sub)
+    mod = _rejecting_mod(fake_ydl_mod, {"v1": "HTTP Error 500"})
+    download(mod, base_sub)
+    assert mod.probes == ["v1"]
+
+
+def test_invalidated_on_settings_change(fake_ydl_mod, base_sub):
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    mod = _rejecting_mod(fake_ydl_mod, {"v1": "upload date is not in range"})
+    download(mod, base_sub)
+    base_sub["matchtitle"] = "Video"
+    mod = _rejecting_mod(fake_ydl_mod, {"v1": "upload date is not in range"})
+    download(mod, base_sub)
+    assert mod.probes == ["v1"]
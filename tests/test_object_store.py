@@ -0,0 +1,124 @@
+import errno
+import os
+import time
+
+from ydl_podcast import cleanup, episode_index, object_store, prepare_sub, run_subscriptions
+from ydl_podcast.state import ObjectStore
+
+
+def _episode(directory, basename, suffixes):
+    os.makedirs(directory, exist_ok=True)
+    for suffix in suffixes:
+        with open(os.path.join(directory, basename + suffix), "w") as f:
+            f.write(suffix)
+
+
+def test_format_key():
+    assert ObjectStore.format_key({"format": "mp4"}) == ObjectStore.format_key({"format": "mp4", "outtmpl": "x"})
+    assert ObjectStore.format_key({"format": "mp4"}) != ObjectStore.format_key({"format": "bestaudio"})
+
+
+def test_object_dir_is_safe(tmp_path):
+    store = ObjectStore(str(tmp_path / "store"))
+    path = store.object_dir("Youtube", "../x/y", "k")
+    assert os.path.dirname(os.path.dirname(path)) == os.path.join(str(tmp_path / "store"), "Youtube")
+
+
+def test_checkin_checkout_release(tmp_path):
+    store = ObjectStore(str(tmp_path / "store"))
+    object_dir = store.object_dir("Youtube", "abc", "k")
+    a, b = str(tmp_path / "a"), str(tmp_path / "b")
+    _episode(a, "ep [abc]", [".mp4", ".info.json", ".jpg", ".meta"])
+    assert store.checkin(object_dir, os.path.join(a, "ep [abc]"))
+    assert sorted(os.listdir(object_dir)) == ["episode.info.json", "episode.jpg", "episode.mp4"]
+
+    os.makedirs(b)
+    linked = store.checkout(object_dir, os.path.join(b, "other [abc]"))
+    assert sorted(os.path.basename(p) for p in linked) == ["other [abc].info.json", "other [abc].jpg", "other [abc].mp4"]
+    assert os.stat(os.path.join(object_dir, "episode.mp4")).st_nlink == 3
+
+    for name in os.listdir(a):
+        os.remove(os.path.join(a, name))
+    assert not store.release(object_dir)
+    for name in os.listdir(b):
+        os.remove(os.path.join(b, name))
+    assert store.release(object_dir)
+    assert os.listdir(str(tmp_path / "store")) == []
+
+
+def test_checkout_incomplete_object(tmp_path):
+    store = ObjectStore(str(tmp_path / "store"))
+    object_dir = store.object_dir("Youtube", "abc", "k")
+    _episode(object_dir, "episode", [".info.json"])
+    assert store.checkout(object_dir, str(tmp_path / "ep")) == []
+
+
+def test_subscriptions_share_downloads(tmp_path, base_config, fake_ydl_mod):
+    mod = fake_ydl_mod(count=2)
+    base_config["shared_store"] = True
+    subs = [
+        prepare_sub(base_config, {"name": "channel", "url": "https://example.com/channel"}),
+        prepare_sub(base_config, {"name": "playlist", "url": "https://example.com/channel?list=x"}),
+    ]
+    results = run_subscriptions(mod, base_config, subs)
+    assert [r["downloaded"] for r in results] == [2, 2]
+    assert sorted(mod.downloads) == ["v0", "v1"]
+
+    name = "Video v0 [v0][20250101].mp4"
+    assert os.path.samefile(str(tmp_path / "channel" / name), str(tmp_path / "playlist" / name))
+    record = episode_index(subs[1]).get("v0")
+    assert os.path.isdir(record["store"])
+    assert episode_index(subs[1]).rebuild().get("v0")["store"] == record["store"]
+
+    # Objects are only freed once no subscription links to them
+    old = time.time() - 30 * 86400
+    for sub in subs:
+        for f in os.listdir(str(tmp_path / sub["name"])):
+            os.utime(str(tmp_path / sub["name"] / f), (old, old))
+    subs[0]["retention_days"] = subs[1]["retention_days"] = 7
+    cleanup(subs[0])
+    assert os.path.isdir(record["store"])
+    cleanup(subs[1])
+    assert not os.path.exists(record["store"])
+
+
+def test_store_disabled_by_default(base_sub):
+    assert object_store(base_sub) is None
+
+
+def test_checkin_race_keeps_object(tmp_path, monkeypatch):
+    store = ObjectStore(str(tmp_path / "store"))
+    object_dir = store.object_dir("Youtube", "abc", "k")
+    a, b = str(tmp_path / "a"), str(tmp_path / "b")
+    _episode(a, "ep [abc]", [".mp4", ".info.json"])
+    _episode(b, "ep [abc]", [".mp4", ".info.json"])
+    assert store.checkin(object_dir, os.path.join(a, "ep [abc]"))
+    # The other subscription passed the exists() check before the object was complete
+    monkeypatch.setattr("ydl_podcast.state.os.path.exists", lambda path: False)
+    assert store.checkin(object_dir, os.path.join(b, "ep [abc]"))
+    assert os.path.samefile(os.path.join(object_dir, "episode.mp4"), os.path.join(a, "ep [abc].mp4"))
+
+
+def test_checkin_other_filesystem(tmp_path, monkeypatch):
+    store = ObjectStore(str(tmp_path / "store"))
+    object_dir = store.object_dir("Youtube", "abc", "k")
+    _episode(str(tmp_path / "a"), "ep [abc]", [".mp4"])
+
+    def _link(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr("ydl_podcast.state.os.link", _link)
+    assert not store.checkin(object_dir, str(tmp_path / "a" / "ep [abc]"))
+    assert not os.path.exists(object_dir)
+
+
+def test_parallel_subscriptions_download_once(tmp_path, base_config, fake_ydl_mod):
+    mod = fake_ydl_mod(count=2, delay=0.02)
+    base_config.update({"shared_store": True, "share_extraction": False, "max_parallel_subscriptions": 2})
+    subs = [
+        prepare_sub(base_config, {"name": "channel", "url": "https://example.com/channel"}),
+        prepare_sub(base_config, {"name": "playlist", "url": "https://example.com/channel?list=x"}),
+    ]
+    results = run_subscriptions(mod, base_config, subs)
+    assert [r["downloaded"] for r in results] == [2, 2]
+    assert sorted(mod.downloads) == ["v0", "v1"]
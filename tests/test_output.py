@@ -0,0 +1,41 @@
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from ydl_podcast.output import ThreadOutput, inherit_output
+
+
+def test_capture_buffers_until_done():
+    stream = io.StringIO()
+    output = ThreadOutput(stream)
+    with output.capture():
+        output.write("line\n")
+        assert stream.getvalue() == ""
+    assert stream.getvalue() == "line\n"
+
+
+def test_pool_threads_join_captured_output(monkeypatch):
+    stream = io.StringIO()
+    output = ThreadOutput(stream)
+    monkeypatch.setattr(sys, "stdout", output)
+
+    def _worker(i):
+        print("worker %d" % i)
+
+    with output.capture():
+        print("start")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(inherit_output(_worker), range(2)))
+        assert stream.getvalue() == ""
+        print("end")
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == "start" and lines[-1] == "end"
+    assert sorted(lines[1:3]) == ["worker 0", "worker 1"]
+
+
+def test_inherit_outside_capture_is_noop():
+    def _worker():
+        pass
+
+    assert inherit_output(_worker) is _worker
+    assert ThreadOutput(io.StringIO()).inherit(_worker) is _worker
@@ -0,0 +1,72 @@
+import json
+import os
+import stat
+from unittest.mock import patch
+
+from ydl_podcast import download, split_postprocessors
+from ydl_podcast.media import priority_prefix
+
+
+def _audio_sub(base_sub, ffmpeg, workers=2):
+    base_sub.update({
+        "audio_only": True,
+        "format": "mp3",
+        "postprocess_workers": workers,
+        "ydl_options": {"ffmpeg_location": ffmpeg},
+    })
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    return base_sub
+
+
+def test_split_postprocessors():
+    options = {"postprocessors": [{"key": "FFmpegMetadata"}, {"key": "FFmpegExtractAudio", "preferredcodec": "mp3"}]}
+    download_options, audio = split_postprocessors(options)
+    assert download_options["postprocessors"] == [{"key": "FFmpegMetadata"}]
+    assert audio["preferredcodec"] == "mp3"
+    assert options["postprocessors"][1] is audio
+    assert split_postprocessors({"format": "best"}) == ({"format": "best"}, None)
+
+
+def test_priority_prefix(monkeypatch):
+    monkeypatch.setattr("shutil.which", lambda name: "/usr/bin/" + name)
+    assert priority_prefix() == []
+    assert priority_prefix(10) == ["nice", "-n", "10"]
+    assert priority_prefix(10, 3) == ["ionice", "-c", "3", "nice", "-n", "10"]
+    monkeypatch.setattr("shutil.which", lambda name: None)
+    assert priority_prefix(10, 3) == []
+
+
+def test_postprocess_pool(fake_ydl_mod, base_sub, fake_ffmpeg):
+    mod = fake_ydl_mod(count=3)
+    sub = _audio_sub(base_sub, fake_ffmpeg)
+    downloaded = download(mod, sub)
+    assert sorted(e["id"] for e in downloaded) == ["v0", "v1", "v2"]
+    d = os.path.join(sub["output_dir"], sub["name"])
+    names = os.listdir(d)
+    assert sorted(n for n in names if n.endswith(".mp3")) == ["Video v%d [v%d][20250101].mp3" % (i, i) for i in range(3)]
+    # The raw downloads are replaced by the extracted audio
+    assert not any(n.endswith(".mp4") for n in names)
+    with open(os.path.join(d, "Video v0 [v0][20250101].meta")) as f:
+        assert json.load(f)["ext"] == "mp3"
+
+
+def test_postprocess_failure_keeps_meta_pending(tmp_path, fake_ydl_mod, base_sub):
+    failing = tmp_path / "ffmpeg"
+    failing.write_text("#!/bin/sh\nexit 1\n")
+    failing.chmod(failing.stat().st_mode | stat.S_IEXEC)
+    mod = fake_ydl_mod(count=2)
+    sub = _audio_sub(base_sub, str(failing), workers=1)
+    assert download(mod, sub) == []
+    d = os.path.join(sub["output_dir"], sub["name"])
+    names = os.listdir(d)
+    assert not any(n.endswith(".meta") for n in names)
+    # The raw download is kept for the next attempt
+    assert sum(n.endswith(".mp4") for n in names) == 2
+
+
+def test_postprocess_does_not_list_directory(fake_ydl_mod, base_sub, fake_ffmpeg):
+    mod = fake_ydl_mod(count=2)
+    sub = _audio_sub(base_sub, fake_ffmpeg)
+    with patch("ydl_podcast.os.listdir", side_effect=AssertionError("directory listed")):
+        downloaded = download(mod, sub)
+    assert sorted(e["ext"] for e in downloaded) == ["mp3", "mp3"]
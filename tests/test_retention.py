@@ -0,0 +1,109 @@
+import datetime
+import json
+import os
+
+from ydl_podcast import cleanup, episode_index, sub_snapshot
+from ydl_podcast.retention import episode_groups, plan_retention
+
+
+def _episode(directory, basename, upload_date, size=1, partial=False):
+    os.makedirs(directory, exist_ok=True)
+    md = {"id": basename, "title": basename, "upload_date": upload_date, "ext": "mp4", "format": "mp4"}
+    with open(os.path.join(directory, basename + ".info.json"), "w") as f:
+        json.dump(md, f)
+    with open(os.path.join(directory, basename + ".meta"), "w") as f:
+        json.dump(md, f)
+    with open(os.path.join(directory, basename + (".mp4.part" if partial else ".mp4")), "w") as f:
+        f.write("x" * size)
+
+
+def _days_ago(days):
+    return (datetime.date.today() - datetime.timedelta(days=days)).strftime("%Y%m%d")
+
+
+def _group(basename, uploaded, size=1, partial=False):
+    return {"basename": basename, "files": [], "size": size, "mtime": 0, "uploaded": uploaded, "partial": partial}
+
+
+def test_plan_keep_last():
+    groups = [_group("a", 1), _group("b", 3), _group("c", 2)]
+    assert [g["basename"] for g in plan_retention(groups, keep_last=2)] == ["a"]
+
+
+def test_plan_max_bytes_evicts_oldest():
+    groups = [_group("a", 1, 10), _group("b", 3, 10), _group("c", 2, 10), _group("d", 4, 5, partial=True)]
+    assert [g["basename"] for g in plan_retention(groups, max_bytes=22)] == ["a", "c"]
+
+
+def test_plan_nothing_to_do():
+    assert plan_retention([_group("a", 1)]) == []
+
+
+def test_groups_protect_show_files(tmp_path, base_sub):
+    d = str(tmp_path / "testsub")
+    _episode(d, "ep", _days_ago(1))
+    for name in ["icon.jpg", "tvshow.nfo"]:
+        open(os.path.join(d, name), "w").close()
+    groups = episode_groups(sub_snapshot(base_sub))
+    assert [sorted(g["files"]) for g in groups] == [["ep.info.json", "ep.meta", "ep.mp4"]]
+
+
+def test_cleanup_by_upload_date(tmp_path, base_sub):
+    base_sub["retention_days"] = 7
+    d = str(tmp_path / "testsub")
+    _episode(d, "old", _days_ago(30))
+    _episode(d, "new", _days_ago(1))
+    open(os.path.join(d, "icon.jpg"), "w").close()
+    index = episode_index(base_sub)
+    assert "old" in index
+    deleted = cleanup(base_sub)
+    assert sorted(os.path.basename(p) for p in deleted) == ["old.info.json", "old.meta", "old.mp4"]
+    assert sorted(os.listdir(d)) == ["icon.jpg", "new.info.json", "new.meta", "new.mp4"]
+    assert episode_index(base_sub).get("old")["retired"]
+
+
+def test_cleanup_keep_last_and_max_bytes(tmp_path, base_sub):
+    d = str(tmp_path / "testsub")
+    for i in range(4):
+        _episode(d, "ep%d" % i, _days_ago(10 - i), size=100)
+    base_sub["keep_last"] = 3
+    assert {os.path.basename(p) for p in cleanup(base_sub)} == {"ep0.info.json", "ep0.meta", "ep0.mp4"}
+    base_sub["max_bytes"] = sum(g["size"] for g in episode_groups(sub_snapshot(base_sub)) if g["basename"] != "ep1")
+    deleted = cleanup(base_sub)
+    assert {os.path.basename(p) for p in deleted} == {"ep1.info.json", "ep1.meta", "ep1.mp4"}
+
+
+def test_cleanup_keeps_partial_downloads(tmp_path, base_sub):
+    d = str(tmp_path / "testsub")
+    _episode(d, "done", _days_ago(2))
+    _episode(d, "downloading", _days_ago(3), partial=True)
+    base_sub["keep_last"] = 0
+    cleanup(base_sub)
+    assert "downloading.mp4.part" in os.listdir(d)
+    assert "done.mp4" not in os.listdir(d)
+
+
+def test_cleanup_groups_subtitles_with_episode(tmp_path, base_sub):
+    d = str(tmp_path / "testsub")
+    for i in range(3):
+        _episode(d, "ep%d" % i, _days_ago(10 - i))
+        open(os.path.join(d, "ep%d.en.vtt" % i), "w").close()
+    base_sub["keep_last"] = 2
+    deleted = cleanup(base_sub)
+    assert {os.path.basename(p) for p in deleted} == {"ep0.info.json", "ep0.meta", "ep0.mp4", "ep0.en.vtt"}
+    assert sorted(os.listdir(d)) == sorted(
+        "ep%d.%s" % (i, ext) for i in (1, 2) for ext in ("info.json", "meta", "mp4", "en.vtt")
+    )
+
+
+def test_deleted_episodes_not_downloaded_again(fake_ydl_mod, base_sub):
+    from ydl_podcast import download
+
+    mod = fake_ydl_mod(count=3)
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    base_sub["keep_last"] = 1
+    download(mod, base_sub)
+    assert len(cleanup(base_sub)) > 0
+    mod.downloads.clear()
+    assert download(mod, base_sub) == []
+    assert mod.downloads == []
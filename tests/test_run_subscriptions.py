@@ -0,0 +1,47 @@
+import os
+
+from ydl_podcast import prepare_sub, run_subscriptions, print_summary
+
+
+def _subs(base_config, names):
+    return [
+        prepare_sub(base_config, {"name": name, "skip_download": True})
+        for name in names
+    ]
+
+
+def test_prepare_sub_erroneous(base_config):
+    assert prepare_sub(base_config, {"name": "s"}) is None
+
+
+def test_prepare_sub_disables_initialize(tmp_path, base_config):
+    (tmp_path / "s").mkdir()
+    sub = prepare_sub(base_config, {"name": "s", "url": "http://x", "initialize": True})
+    assert sub["initialize"] is False
+
+
+def test_parallel_writes_all_feeds(tmp_path, make_info_json, base_config):
+    base_config["max_parallel_subscriptions"] = 3
+    for name in ["a", "b", "c"]:
+        make_info_json(sub_name=name)
+    results = run_subscriptions(None, base_config, _subs(base_config, ["a", "b", "c"]))
+    assert [r["name"] for r in results] == ["a", "b", "c"]
+    assert all(r["status"] == "ok" for r in results)
+    for name in ["a", "b", "c"]:
+        assert os.path.isfile(os.path.join(str(tmp_path), "%s.xml" % name))
+
+
+def test_failure_is_isolated(tmp_path, make_info_json, base_config, capsys):
+    base_config["max_parallel_subscriptions"] = 2
+    make_info_json(sub_name="good")
+    make_info_json(sub_name="bad")
+    subs = _subs(base_config, ["good", "bad"])
+    subs[1]["url_root"] = None
+    results = run_subscriptions(None, base_config, subs)
+    assert results[0]["status"] == "ok"
+    assert results[1]["status"] == "failed"
+    assert results[1]["error"]
+
+    print_summary(results)
+    out = capsys.readouterr().out
+    assert "1 ok, 1 failed" in out
@@ -0,0 +1,117 @@
+import threading
+
+from ydl_podcast import prepare_sub
+from ydl_podcast.scheduler import Scheduler, run_daemon
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _no_jitter(a, b):
+    return 0
+
+
+def test_all_due_at_start():
+    clock = Clock()
+    subs = [{"name": "a"}, {"name": "b"}]
+    scheduler = Scheduler(subs, clock=clock, rand=_no_jitter)
+    assert [s["name"] for s in scheduler.pop_due()] == ["a", "b"]
+    assert scheduler.pop_due() == []
+
+
+def test_per_sub_interval():
+    clock = Clock()
+    subs = [{"name": "a", "poll_interval": 60}, {"name": "b", "poll_interval": 600}]
+    scheduler = Scheduler(subs, clock=clock, rand=_no_jitter)
+    for sub in scheduler.pop_due():
+        scheduler.reschedule(sub, {"status": "ok"})
+    assert scheduler.next_poll == {"a": 1060.0, "b": 1600.0}
+    clock.now = 1100
+    assert [s["name"] for s in scheduler.pop_due()] == ["a"]
+
+
+def test_backoff_after_failures():
+    clock = Clock()
+    sub = {"name": "a", "poll_interval": 60, "poll_backoff": 2, "poll_max_interval": 200}
+    scheduler = Scheduler([sub], clock=clock, rand=_no_jitter)
+    scheduler.pop_due()
+    assert scheduler.reschedule(sub, {"status": "failed"}) == 1120.0
+    assert scheduler.reschedule(sub, {"status": "failed"}) == 1200.0
+    assert scheduler.reschedule(sub, {"status": "failed"}) == 1200.0
+    assert scheduler.reschedule(sub, {"status": "ok"}) == 1060.0
+
+
+def test_jitter_bounds():
+    sub = {"name": "a", "poll_interval": 100, "poll_jitter": 0.2}
+    scheduler = Scheduler([sub], rand=lambda a, b: b)
+    assert scheduler.interval(sub) == 120.0
+
+
+def test_run_daemon_polls_and_stops(tmp_path, make_info_json, base_config):
+    make_info_json(sub_name="a")
+    sub = prepare_sub(base_config, {"name": "a", "skip_download": True, "poll_interval": 3600})
+    stop = threading.Event()
+    thread = threading.Thread(target=run_daemon, args=(None, base_config, [sub], stop))
+    thread.start()
+    for _ in range(100):
+        if (tmp_path / "a.xml").exists():
+            break
+        stop.wait(0.02)
+    stop.set()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert (tmp_path / "a.xml").exists()
+
+
+def _write_uploads(tmp_path, dates, sub_name="a"):
+    import json
+
+    d = tmp_path / sub_name
+    d.mkdir(exist_ok=True)
+    for i, upload_date in enumerate(dates):
+        (d / ("ep%d [e%d].info.json" % (i, i))).write_text(json.dumps({"id": "e%d" % i, "upload_date": upload_date}))
+
+
+def _ts(upload_date):
+    import datetime
+
+    return datetime.datetime.strptime(upload_date, "%Y%m%d").timestamp()
+
+
+def test_adaptive_weekly_channel(tmp_path):
+    _write_uploads(tmp_path, ["20250101", "20250108", "20250115"])
+    sub = {"name": "a", "output_dir": str(tmp_path), "poll_adaptive": True, "poll_per_upload": 7}
+    clock = Clock()
+    clock.now = _ts("20250115") + 3600
+    scheduler = Scheduler([sub], clock=clock, rand=_no_jitter)
+    assert scheduler.interval(sub) == 86400
+
+
+def test_adaptive_bounds(tmp_path):
+    _write_uploads(tmp_path, ["20250101", "20250101", "20250101"], sub_name="busy")
+    _write_uploads(tmp_path, ["20200101", "20210101"], sub_name="dead")
+    clock = Clock()
+    clock.now = _ts("20250101")
+    busy = {"name": "busy", "output_dir": str(tmp_path), "poll_adaptive": True, "poll_min_interval": 600}
+    dead = {"name": "dead", "output_dir": str(tmp_path), "poll_adaptive": True, "poll_max_interval": 7200}
+    scheduler = Scheduler([busy, dead], clock=clock, rand=_no_jitter)
+    assert scheduler.interval(busy) == 600
+    assert scheduler.interval(dead) == 7200
+
+
+def test_adaptive_without_history(tmp_path):
+    sub = {"name": "a", "output_dir": str(tmp_path), "poll_adaptive": True, "poll_interval": 1234}
+    scheduler = Scheduler([sub], clock=Clock(), rand=_no_jitter)
+    assert scheduler.interval(sub) == 1234
+
+
+def test_predict(tmp_path):
+    clock = Clock()
+    subs = [{"name": "a", "poll_interval": 60}, {"name": "b", "poll_interval": 120}]
+    scheduler = Scheduler(subs, clock=clock, rand=lambda a, b: 1)
+    assert scheduler.predict() == {"a": 1060.0, "b": 1120.0}
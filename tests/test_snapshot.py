@@ -0,0 +1,66 @@
+import os
+from unittest.mock import patch
+
+import ydl_podcast
+from ydl_podcast import sub_snapshot, write_sub_nfo, write_xml, cleanup
+from ydl_podcast.state import DirSnapshot, episode_basename
+
+
+def test_episode_basename():
+    assert episode_basename("Video [id].info.json") == "Video [id]"
+    assert episode_basename("Video [id].mp4") == "Video [id]"
+    assert episode_basename("Video [id].meta") == "Video [id]"
+
+
+def test_groups_by_basename(make_info_json, tmp_path):
+    make_info_json()
+    snapshot = DirSnapshot(str(tmp_path / "testsub"))
+    assert sorted(snapshot.group("Test Video [abc123][20250101]")) == [
+        "Test Video [abc123][20250101].info.json",
+        "Test Video [abc123][20250101].jpg",
+        "Test Video [abc123][20250101].mp4",
+    ]
+
+
+def test_remove_updates_groups(make_info_json, tmp_path):
+    make_info_json()
+    snapshot = DirSnapshot(str(tmp_path / "testsub"))
+    snapshot.remove("Test Video [abc123][20250101].mp4")
+    assert not snapshot.isfile("Test Video [abc123][20250101].mp4")
+    assert len(snapshot.group("Test Video [abc123][20250101]")) == 2
+
+
+def test_stages_share_one_scan(make_info_json, base_sub, base_config):
+    make_info_json()
+    base_sub["nfo_files"] = True
+    base_sub["retention_days"] = 30
+    snapshot = sub_snapshot(base_sub)
+    with patch("ydl_podcast.os.scandir") as scandir, patch("ydl_podcast.os.path.getmtime") as getmtime, \
+            patch("ydl_podcast.metadata_parse", wraps=ydl_podcast.metadata_parse) as parse:
+        cleanup(base_sub, snapshot)
+        write_sub_nfo(base_sub, snapshot)
+        write_xml(base_config, base_sub, snapshot)
+    scandir.assert_not_called()
+    getmtime.assert_not_called()
+    assert parse.call_count == 1
+    assert os.path.isfile(os.path.join(base_sub["output_dir"], "testsub.xml"))
+
+
+def test_groups_multi_dot_sidecars(make_info_json, tmp_path):
+    make_info_json(basename="Mr. Video [abc123]")
+    d = tmp_path / "testsub"
+    (d / "Mr. Video [abc123].en.vtt").write_text("")
+    (d / "Mr. Video [abc123].mp4.part").write_text("")
+    snapshot = DirSnapshot(str(d))
+    assert sorted(snapshot.group("Mr. Video [abc123]")) == [
+        "Mr. Video [abc123].en.vtt",
+        "Mr. Video [abc123].info.json",
+        "Mr. Video [abc123].jpg",
+        "Mr. Video [abc123].mp4",
+        "Mr. Video [abc123].mp4.part",
+    ]
+    (d / "Mr. Video [abc123].fr.vtt").write_text("")
+    snapshot.add("Mr. Video [abc123].fr.vtt")
+    assert "Mr. Video [abc123].fr.vtt" in snapshot.group("Mr. Video [abc123]")
+    snapshot.remove("Mr. Video [abc123].en.vtt")
+    assert len(snapshot.group("Mr. Video [abc123]")) == 5
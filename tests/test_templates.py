@@ -0,0 +1,28 @@
+import os
+
+from jinja2 import Template
+
+from ydl_podcast import get_template, render_to_file, template_environment, write_xml
+from ydl_podcast.templates.feed import FEED_TMPL
+
+
+def test_templates_compiled_once():
+    assert get_template("feed.xml") is get_template("feed.xml", {})
+
+
+def test_render_to_file_matches_render(tmp_path):
+    context = {"channel_title": "t", "items": [{"title": "a & b", "id": "x"}], "style_rss_feed": True}
+    path = str(tmp_path / "feed.xml")
+    render_to_file(get_template("feed.xml"), path, context)
+    with open(path) as f:
+        assert f.read() == Template(FEED_TMPL).render(context)
+
+
+def test_bytecode_cache(tmp_path, make_info_json, base_sub, base_config):
+    make_info_json()
+    cache_dir = str(tmp_path / "cache")
+    base_sub["template_cache_dir"] = cache_dir
+    write_xml(base_config, base_sub)
+    assert template_environment(cache_dir).bytecode_cache is not None
+    assert len(os.listdir(cache_dir)) == 1
+    assert os.path.isfile(str(tmp_path / "testsub.xml"))
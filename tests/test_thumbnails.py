@@ -0,0 +1,89 @@
+import datetime
+import os
+
+from PIL import Image
+
+from ydl_podcast import process_sub, sub_snapshot, write_sub_thumbnails, write_xml
+from ydl_podcast.state import DirSnapshot, episode_basename
+from ydl_podcast.thumbnails import convert_image, plan_thumbnails, resize_square, sized_name
+
+
+def _image(path, size=(640, 360), fmt=None):
+    Image.new("RGB", size, color="blue").save(path, fmt)
+
+
+def test_sized_name_groups_with_episode():
+    assert sized_name("ep [x]", 1400) == "ep [x].1400x1400.jpg"
+    assert episode_basename("ep [x].1400x1400.jpg") == "ep [x]"
+
+
+def test_resize_square():
+    assert resize_square(Image.new("RGB", (1920, 1080)), 300).size == (300, 300)
+    assert resize_square(Image.new("RGB", (200, 100)), 300).size == (300, 300)
+
+
+def test_convert_image_keeps_source_mtime(tmp_path):
+    src = str(tmp_path / "ep.webp")
+    _image(src, fmt="WEBP")
+    os.utime(src, (1000, 1000))
+    dst = convert_image(src, str(tmp_path / "ep.300x300.jpg"), 300, quality=80)
+    with Image.open(dst) as im:
+        assert im.size == (300, 300)
+        assert im.format == "JPEG"
+    assert os.stat(dst).st_mtime == 1000
+    assert [n for n in os.listdir(str(tmp_path)) if n.startswith(".")] == []
+
+
+def test_plan_thumbnails(tmp_path):
+    _image(str(tmp_path / "a.webp"), fmt="WEBP")
+    _image(str(tmp_path / "b.jpg"))
+    (tmp_path / "b.mp4").write_text("media")
+    jobs = plan_thumbnails(DirSnapshot(str(tmp_path)), [100])
+    assert sorted(jobs) == [
+        ("a.webp", "a.100x100.jpg", 100),
+        ("a.webp", "a.jpg", None),
+        ("b.jpg", "b.100x100.jpg", 100),
+    ]
+
+
+def test_write_sub_thumbnails(tmp_path, make_info_json, base_sub, base_config):
+    make_info_json()
+    d = tmp_path / "testsub"
+    _image(str(d / "icon.jpg"), size=(3000, 3000))
+    base_sub["thumbnail_sizes"] = [1400, 100]
+    snapshot = sub_snapshot(base_sub)
+    written = write_sub_thumbnails(base_sub, snapshot)
+    assert sorted(written) == [
+        "Test Video [abc123][20250101].100x100.jpg",
+        "Test Video [abc123][20250101].1400x1400.jpg",
+        "icon.100x100.jpg",
+        "icon.1400x1400.jpg",
+    ]
+    assert snapshot.isfile("icon.1400x1400.jpg")
+
+    # Up to date copies are not converted again
+    assert write_sub_thumbnails(base_sub) == []
+    os.utime(str(d / "icon.jpg"), (2000, 2000))
+    assert sorted(write_sub_thumbnails(base_sub)) == ["icon.100x100.jpg", "icon.1400x1400.jpg"]
+
+    write_xml(base_config, base_sub)
+    feed = (tmp_path / "testsub.xml").read_text()
+    assert "icon.1400x1400.jpg" in feed
+    assert "%5D.1400x1400.jpg" in feed
+
+
+def test_pool_converts_after_retention(tmp_path, make_info_json, base_sub, base_config, capsys):
+    old = (datetime.date.today() - datetime.timedelta(days=60)).strftime("%Y%m%d")
+    new = datetime.date.today().strftime("%Y%m%d")
+    make_info_json({"id": "old", "upload_date": old}, basename="Old [old]")
+    make_info_json({"id": "new", "upload_date": new}, basename="New [new]")
+    d = tmp_path / "testsub"
+    for basename in ["Old [old]", "New [new]"]:
+        os.remove(str(d / (basename + ".jpg")))
+        _image(str(d / (basename + ".webp")), fmt="WEBP")
+    base_sub.update({"skip_download": True, "retention_days": 30})
+    result = process_sub(None, base_config, base_sub)
+    assert result["status"] == "ok"
+    assert "Converted 1 thumbnail(s)" in capsys.readouterr().out
+    assert sorted(os.listdir(str(d))) == ["New [new].info.json", "New [new].jpg", "New [new].mp4", "New [new].webp"]
+    assert "New%20%5Bnew%5D.jpg" in (tmp_path / "testsub.xml").read_text()
@@ -1,3 +1,4 @@
+import json
 import os
 import xml.etree.ElementTree as ET
 
@@ -114,3 +115,91 @@ def test_icon_url(tmp_path, make_info_json, base_sub, base_config):
         content = f.read()
     assert "itunes:image" in content
     assert "icon.jpg" in content
+
+
+def test_unchanged_feed_not_rewritten(tmp_path, make_info_json, base_sub, base_config):
+    make_info_json()
+    sub = _setup_sub(tmp_path, make_info_json, base_sub, base_config)
+    assert write_xml(base_config, sub)
+    xml_path = os.path.join(str(tmp_path), "testsub.xml")
+    with open(xml_path + ".headers.json") as f:
+        headers = json.load(f)
+    assert headers["etag"] == '"%s"' % headers["hash"][:32]
+    assert headers["last_modified"].endswith(" GMT")
+    mtime = os.stat(xml_path).st_mtime_ns
+
+    assert not write_xml(base_config, sub)
+    assert os.stat(xml_path).st_mtime_ns == mtime
+
+    make_info_json(overrides={"id": "def456"}, basename="Other [def456][20250101]")
+    assert write_xml(base_config, sub)
+    with open(xml_path + ".headers.json") as f:
+        assert json.load(f)["hash"] != headers["hash"]
+    assert not os.path.exists(xml_path + ".tmp")
+
+
+def test_deleted_feed_rewritten(tmp_path, make_info_json, base_sub, base_config):
+    make_info_json()
+    sub = _setup_sub(tmp_path, make_info_json, base_sub, base_config)
+    write_xml(base_config, sub)
+    os.remove(os.path.join(str(tmp_path), "testsub.xml"))
+    assert write_xml(base_config, sub)
+
+
+def _episodes(make_info_json, days):
+    for day in days:
+        make_info_json(
+            overrides={"id": "e%02d" % day, "upload_date": "202501%02d" % day},
+            basename="Episode [e%02d][202501%02d]" % (day, day),
+        )
+
+
+def _guids(path):
+    return [g.text for g in ET.parse(path).getroot().iter("guid")]
+
+
+def _links(path):
+    return {
+        link.get("rel"): link.get("href")
+        for link in ET.parse(path).getroot().iter("{http://www.w3.org/2005/Atom}link")
+    }
+
+
+def test_paged_feed(tmp_path, make_info_json, base_sub, base_config):
+    _episodes(make_info_json, range(1, 6))
+    sub = _setup_sub(tmp_path, make_info_json, base_sub, base_config, feed_max_items=2)
+    write_xml(base_config, sub)
+
+    main, page1, page2 = (os.path.join(str(tmp_path), name) for name in ["testsub.xml", "testsub-page-1.xml", "testsub-page-2.xml"])
+    assert _guids(main) == ["e05", "e04"]
+    assert _guids(page2) == ["e03"]
+    assert _guids(page1) == ["e02", "e01"]
+    assert _links(main)["next"] == "http://localhost:8080/testsub-page-2.xml"
+    assert _links(page2) == {
+        "first": "http://localhost:8080/testsub.xml",
+        "last": "http://localhost:8080/testsub-page-1.xml",
+        "previous": "http://localhost:8080/testsub.xml",
+        "next": "http://localhost:8080/testsub-page-1.xml",
+    }
+    assert "next" not in _links(page1)
+
+    # A new episode only rewrites the main feed and the newest page
+    mtime = os.stat(page1).st_mtime_ns
+    _episodes(make_info_json, [6])
+    write_xml(base_config, sub)
+    assert os.stat(page1).st_mtime_ns == mtime
+    assert _guids(page2) == ["e04", "e03"]
+
+    # Stale pages are removed
+    sub["feed_max_items"] = 10
+    write_xml(base_config, sub)
+    assert not os.path.exists(page1)
+    assert not os.path.exists(page1 + ".headers.json")
+    assert len(_guids(main)) == 6
+
+
+def test_unpaged_feed_has_no_links(tmp_path, make_info_json, base_sub, base_config):
+    _episodes(make_info_json, range(1, 3))
+    sub = _setup_sub(tmp_path, make_info_json, base_sub, base_config)
+    write_xml(base_config, sub)
+    assert _links(os.path.join(str(tmp_path), "testsub.xml")) == {}
@@ -0,0 +1,44 @@
+import os
+import threading
+
+from ydl_podcast import YdlPool, download
+
+
+def test_reuses_instance_with_runtime_overrides(fake_ydl_mod):
+    mod = fake_ydl_mod()
+    pool = YdlPool(mod)
+    with pool.session({"outtmpl": "x", "simulate": True}) as ydl:
+        first = ydl
+        assert ydl.params["simulate"] is True
+    with pool.session({"outtmpl": "x"}) as ydl:
+        assert ydl is first
+        assert "simulate" not in ydl.params
+    assert (pool.created, pool.reused) == (1, 1)
+
+
+def test_different_options_get_different_instances(fake_ydl_mod):
+    mod = fake_ydl_mod()
+    pool = YdlPool(mod)
+    with pool.session({"outtmpl": "x"}) as a:
+        pass
+    with pool.session({"outtmpl": "y"}) as b:
+        pass
+    assert a is not b
+    assert pool.created == 2
+
+
+def test_busy_instance_not_shared(fake_ydl_mod):
+    mod = fake_ydl_mod()
+    pool = YdlPool(mod)
+    with pool.session({"outtmpl": "x"}) as a:
+        with pool.session({"outtmpl": "x"}) as b:
+            assert a is not b
+
+
+def test_download_reuses_instances(fake_ydl_mod, base_sub, capsys):
+    mod = fake_ydl_mod(count=5)
+    os.makedirs(os.path.join(base_sub["output_dir"], base_sub["name"]))
+    assert len(download(mod, base_sub)) == 5
+    # The playlist stream holds one instance, probes and downloads share another
+    assert mod.instances == 2
+    assert "2 created, 9 reused" in capsys.readouterr().out